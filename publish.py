@@ -4,7 +4,19 @@ Simple notebook publishing script for BIRN workshop.
 Processes notebooks with metadata and solution-tagged cells.
 """
 
+import argparse
+import math
+import ctypes
+import gzip
+import hashlib
+import html
 import json
+import logging
+import os
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
 from pathlib import Path
 import zipfile
 from glob import glob
@@ -13,11 +25,40 @@ import re
 import shutil
 import subprocess
 import sys
+import threading
+import time
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
 try:
     import markdown
 except ImportError:
     print("Warning: 'markdown' package not installed. Install with: pip install markdown")
     markdown = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+# Part of cache keys for anything extracted with pypdf, so upgrading or installing it redoes them
+PYPDF_VERSION = pypdf.__version__ if pypdf is not None else 'none'
+try:
+    import numpy
+except ImportError:
+    numpy = None
+try:
+    import pyarrow
+    import pyarrow.csv
+    import pyarrow.feather
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
 
 def get_notebook_metadata(notebook):
     """Extract workshop metadata from notebook."""
@@ -61,219 +102,611 @@ def generate_toc_from_markdown(markdown_content, has_useful_links=False):
     
     return "\n".join(toc_lines) + "\n"
 
-def markdown_to_html(content, title=""):
-    """Convert markdown to HTML with basic styling."""
+SITE_CSS = """
+body {
+    max-width: 800px;
+    margin: 40px auto;
+    padding: 0 20px;
+    font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, sans-serif;
+    line-height: 1.6;
+    color: #333;
+    font-size: 16px;
+    padding-bottom: 5em;
+}
+h1, h3, h4 { margin-top: 2em; }
+h2 {
+    position: sticky;
+    top: 0;
+    background: white;
+    padding-top: 2em;
+    padding-bottom: 0.5em;
+    z-index: 100;
+    border-bottom: 2px solid #eee;
+}
+/* Give the first h2 (Table of Contents) less top margin */
+h2:first-of-type {
+    margin-top: 1em;
+    padding-top: 1em;
+}
+h3 a {
+    text-decoration: none;
+}
+h3 a:hover {
+    text-decoration: underline;
+}
+p {
+    margin: 1em 0;
+}
+code { 
+    background: #f4f4f4; 
+    padding: 2px 4px; 
+    border-radius: 3px;
+    font-family: Consolas, Monaco, monospace;
+}
+pre { 
+    background: #f4f4f4; 
+    padding: 1em; 
+    border-radius: 5px; 
+    overflow-x: auto;
+}
+pre code { background: none; padding: 0; }
+a { color: #0066cc; }
+img {
+    display: block;
+    max-width: 80%;
+    height: auto;
+    margin: 1em auto;
+    border: solid 1px #999;
+}
+blockquote {
+    border-left: solid lightblue 20px;
+    margin-left: 4em;
+    padding-left: 1em;
+    color: #999;
+}
+video {
+    display: block;
+    max-width: 80%;
+    height: auto;
+    margin: 1em auto;
+    border: solid 1px #999;
+}
+.download-box {
+    background: #e8f4f8;
+    padding: 1em;
+    border-radius: 5px;
+    margin: 1em 0;
+}
+ul {
+    list-style-type: disc;
+    padding-left: 2em;
+    margin: 0.5em 0;
+}
+li {
+    margin: 0.3em 0;
+}
+.section-header {
+    margin-top: 2em;
+    margin-bottom: 1em;
+    padding-bottom: 0.5em;
+    border-bottom: 2px solid #eee;
+}
+.resource-buttons {
+    margin: 1em 0;
+    display: flex;
+    flex-wrap: wrap;
+    gap: 0.5em;
+}
+.resource-button {
+    display: inline-block;
+    padding: 0.4em 0.8em;
+    background: #f0f0f0;
+    border: 1px solid #ddd;
+    border-radius: 4px;
+    text-decoration: none;
+    color: #333;
+    font-size: 0.9em;
+    transition: all 0.2s;
+}
+.resource-button:hover {
+    background: #e0e0e0;
+    border-color: #ccc;
+}
+.resource-button.primary {
+    background: #e3f2fd;
+    color: #1565c0;
+    border-color: #90caf9;
+}
+.resource-button.primary:hover {
+    background: #bbdefb;
+    border-color: #64b5f6;
+}
+.resource-button.completed {
+    background: #e8f5e9;
+    color: #2e7d32;
+    border-color: #a5d6a7;
+}
+.resource-button.completed:hover {
+    background: #c8e6c9;
+    border-color: #81c784;
+}
+.data-download {
+    margin: 0.5em 0;
+    font-size: 0.9em;
+}
+.download-links {
+    margin: 0.5em 0;
+    line-height: 1.8;
+}
+.download-links a {
+    color: #1976d2;
+    text-decoration: none;
+}
+.download-links a:hover {
+    text-decoration: underline;
+}
+.catalog table {
+    border-collapse: collapse;
+    width: 100%;
+    font-size: 0.9em;
+}
+.catalog th, .catalog td {
+    border-bottom: 1px solid #eee;
+    padding: 0.4em;
+    text-align: left;
+    vertical-align: top;
+}
+.catalog img {
+    max-width: 100px;
+    margin: 0;
+}
+.catalog .scanned {
+    color: #c62828;
+}
+p:last {
+    margin-bottom: 0;
+    margin-top: 5em;
+}
+"""
+
+SITE_JS = """
+function loadSlides(id, src) {
+    const container = document.querySelector(`#${id} .slide-container`);
+    const preview = document.querySelector(`#${id} .slide-preview`);
+    container.style.display = 'block';
+    preview.style.display = 'none';
+}
+
+function loadCatalogPage(button) {
+    const table = document.querySelector('.catalog tbody');
+    button.disabled = true;
+    fetch(button.dataset.next).then(response => response.json()).then(page => {
+        table.insertAdjacentHTML('beforeend', page.rows);
+        if (page.next) {
+            button.dataset.next = page.next;
+            button.disabled = false;
+        } else {
+            button.remove();
+        }
+    });
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    const button = document.querySelector('.catalog-more');
+    if (!button || !('IntersectionObserver' in window)) return;
+    new IntersectionObserver(entries => {
+        if (entries[0].isIntersecting && !button.disabled) loadCatalogPage(button);
+    }).observe(button);
+});
+"""
+
+def fingerprint(data, length=10):
+    """Return a short content hash for cache-busting filenames."""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()[:length]
+
+def minify_css(css):
+    """Strip comments and insignificant whitespace from CSS."""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.DOTALL)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{}:;,>])\s*', r'\1', css)
+    return css.replace(';}', '}').strip()
+
+def minify_js(js):
+    """Strip indentation and blank lines from JS (no renaming, newlines kept for ASI)."""
+    lines = (line.strip() for line in js.splitlines())
+    return '\n'.join(line for line in lines if line)
+
+# Tags whose contents are whitespace-sensitive and must not be touched
+PRESERVED_HTML_BLOCKS = re.compile(r'<(pre|textarea|script)\b.*?</\1>', re.DOTALL | re.IGNORECASE)
+# Block-level tags where surrounding whitespace never renders
+HTML_BLOCK_TAGS = re.compile(
+    r'\s*(</?(?:html|head|body|meta|link|title|div|p|h[1-6]|ul|ol|li|table|thead|tbody|tr|td|th|'
+    r'blockquote|hr|br|embed|video|source|section|nav)\b[^>]*>)\s*',
+    re.IGNORECASE
+)
+
+def minify_html(html):
+    """Collapse insignificant whitespace and comments in generated HTML."""
+    def squeeze(text):
+        text = re.sub(r'<!--.*?-->', '', text, flags=re.DOTALL)
+        text = re.sub(r'\s+', ' ', text)
+        return HTML_BLOCK_TAGS.sub(r'\1', text)
+    
+    parts = []
+    last = 0
+    for match in PRESERVED_HTML_BLOCKS.finditer(html):
+        parts.append(squeeze(html[last:match.start()]))
+        parts.append(match.group(0))
+        last = match.end()
+    parts.append(squeeze(html[last:]))
+    return ''.join(parts).strip()
+
+def site_assets():
+    """Return {kind: (filename, content)} for the shared, fingerprinted site assets."""
+    css = minify_css(SITE_CSS)
+    js = minify_js(SITE_JS)
+    return {
+        'css': (f"site.{fingerprint(css)}.css", css),
+        'js': (f"site.{fingerprint(js)}.js", js),
+    }
+
+def write_site_assets(output_dir):
+    """Write the shared stylesheet and script that every page links to."""
+    for filename, content in site_assets().values():
+        with atomic_open(output_dir / filename) as f:
+            f.write(content)
+        print(f"✓ Created {output_dir / filename}")
+
+def render_markdown(content, cache_dir=None):
+    """Render a markdown fragment, reusing the cached render of identical content."""
+    if cache_dir is None:
+        return markdown.markdown(content, extensions=['extra', 'codehilite', 'toc'])
+    
+    key = fingerprint(f"{markdown.__version__}\n{content}", 64)
+    entry = cache_entry(cache_dir, 'fragments', key, '.html')
+    if entry.exists():
+        return entry.read_text(encoding='utf-8')
+    html_content = markdown.markdown(content, extensions=['extra', 'codehilite', 'toc'])
+    write_cache_entry(entry, html_content.encode('utf-8'))
+    return html_content
+
+def markdown_to_html(content, title="", cache_dir=None):
+    """Convert markdown to HTML linking the shared site stylesheet and script."""
     if markdown:
-        html_content = markdown.markdown(content, extensions=['extra', 'codehilite', 'toc'])
+        html_content = render_markdown(content, cache_dir)
     else:
         # Fallback: just wrap in pre tags if markdown not available
         html_content = f"<pre>{content}</pre>"
     
-    return f"""<!DOCTYPE html>
+    return html_page(html_content, title)
+
+def html_page(html_content, title=""):
+    """Wrap rendered HTML in a page linking the shared site stylesheet and script."""
+    assets = site_assets()
+    return minify_html(f"""<!DOCTYPE html>
 <html>
 <head>
     <meta charset="utf-8">
     <meta name="viewport" content="width=device-width, initial-scale=1">
     <title>{title}</title>
-    <style>
-        body {{
-            max-width: 800px;
-            margin: 40px auto;
-            padding: 0 20px;
-            font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, sans-serif;
-            line-height: 1.6;
-            color: #333;
-            font-size: 16px;
-            padding-bottom: 5em;
-        }}
-        h1, h3, h4 {{ margin-top: 2em; }}
-        h2 {{
-            position: sticky;
-            top: 0;
-            background: white;
-            padding-top: 2em;
-            padding-bottom: 0.5em;
-            z-index: 100;
-            border-bottom: 2px solid #eee;
-        }}
-        /* Give the first h2 (Table of Contents) less top margin */
-        h2:first-of-type {{
-            margin-top: 1em;
-            padding-top: 1em;
-        }}
-        h3 a {{
-            text-decoration: none;
-        }}
-        h3 a:hover {{
-            text-decoration: underline;
-        }}
-        p {{
-            margin: 1em 0;
-        }}
-        code {{ 
-            background: #f4f4f4; 
-            padding: 2px 4px; 
-            border-radius: 3px;
-            font-family: Consolas, Monaco, monospace;
-        }}
-        pre {{ 
-            background: #f4f4f4; 
-            padding: 1em; 
-            border-radius: 5px; 
-            overflow-x: auto;
-        }}
-        pre code {{ background: none; padding: 0; }}
-        a {{ color: #0066cc; }}
-        img {{
-            display: block;
-            max-width: 80%;
-            height: auto;
-            margin: 1em auto;
-            border: solid 1px #999;
-        }}
-        blockquote {{
-            border-left: solid lightblue 20px;
-            margin-left: 4em;
-            padding-left: 1em;
-            color: #999;
-        }}
-        video {{
-            display: block;
-            max-width: 80%;
-            height: auto;
-            margin: 1em auto;
-            border: solid 1px #999;
-        }}
-        .download-box {{
-            background: #e8f4f8;
-            padding: 1em;
-            border-radius: 5px;
-            margin: 1em 0;
-        }}
-        ul {{
-            list-style-type: disc;
-            padding-left: 2em;
-            margin: 0.5em 0;
-        }}
-        li {{
-            margin: 0.3em 0;
-        }}
-        .section-header {{
-            margin-top: 2em;
-            margin-bottom: 1em;
-            padding-bottom: 0.5em;
-            border-bottom: 2px solid #eee;
-        }}
-        .resource-buttons {{
-            margin: 1em 0;
-            display: flex;
-            flex-wrap: wrap;
-            gap: 0.5em;
-        }}
-        .resource-button {{
-            display: inline-block;
-            padding: 0.4em 0.8em;
-            background: #f0f0f0;
-            border: 1px solid #ddd;
-            border-radius: 4px;
-            text-decoration: none;
-            color: #333;
-            font-size: 0.9em;
-            transition: all 0.2s;
-        }}
-        .resource-button:hover {{
-            background: #e0e0e0;
-            border-color: #ccc;
-        }}
-        .resource-button.primary {{
-            background: #e3f2fd;
-            color: #1565c0;
-            border-color: #90caf9;
-        }}
-        .resource-button.primary:hover {{
-            background: #bbdefb;
-            border-color: #64b5f6;
-        }}
-        .resource-button.completed {{
-            background: #e8f5e9;
-            color: #2e7d32;
-            border-color: #a5d6a7;
-        }}
-        .resource-button.completed:hover {{
-            background: #c8e6c9;
-            border-color: #81c784;
-        }}
-        .data-download {{
-            margin: 0.5em 0;
-            font-size: 0.9em;
-        }}
-        .download-links {{
-            margin: 0.5em 0;
-            line-height: 1.8;
-        }}
-        .download-links a {{
-            color: #1976d2;
-            text-decoration: none;
-        }}
-        .download-links a:hover {{
-            text-decoration: underline;
-        }}
-        p:last {{
-            margin-bottom: 0;
-            margin-top: 5em;
-        }}
-    </style>
+    <link rel="stylesheet" href="./{assets['css'][0]}">
+    <script src="./{assets['js'][0]}" defer></script>
 </head>
 <body>
 {html_content}
 </body>
-</html>"""
+</html>""")
 
-def load_config():
-    """Load workshop configuration from YAML file."""
-    config_path = Path('workshop-config.yaml')
+def load_config(config_path='workshop-config.yaml'):
+    """Load workshop configuration from YAML file.
+    
+    Relative paths in the config (section folders, output_dir, ...) are resolved
+    against the config file's directory, recorded as config['config_dir'].
+    """
+    config_path = Path(config_path)
     if not config_path.exists():
-        print("Warning: workshop-config.yaml not found, using defaults")
-        return {
+        print(f"Warning: {config_path} not found, using defaults")
+        config = {
             'github_repo': 'yourusername/birn-workshop',
             'github_branch': 'main',
             'title': 'Workshop',
             'description': '',
             'output_dir': 'docs'
         }
+    else:
+        with open(config_path, 'r') as f:
+            config = yaml.safe_load(f)
+    
+    config['config_dir'] = str(config_path.parent)
+    config['config_path'] = str(config_path)
+    return config
+
+def resolve_path(config, path):
+    """Resolve a path from the config relative to the config file's directory."""
+    return Path(config.get('config_dir', '.')) / path
+
+def get_worker_count(config):
+    """Number of parallel workers for publish stages."""
+    return config.get('workers') or os.cpu_count() or 1
+
+def get_cache_dir(config):
+    """Directory for cached build artifacts; lives outside output_dir so it survives cleanup."""
+    cache_dir = resolve_path(config, config.get('cache_dir', '.publish-cache'))
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+# Cache entries this process has looked up, so prune_cache() knows what is still in use
+_cache_used = set()
+_cache_used_lock = threading.Lock()
+
+def cache_entry(cache_dir, kind, key, suffix=''):
+    """Path of a content-addressed cache entry, recorded as used by this run."""
+    path = cache_dir / kind / key[:2] / f"{key}{suffix}"
+    with _cache_used_lock:
+        _cache_used.add(path)
+    return path
+
+def prune_cache(cache_dir, max_age_days):
+    """Log the entries this run used, then delete entries no run has used in max_age_days.
+    
+    Each run writes a log under <cache_dir>/runs/ instead of touching entries, since
+    outputs are hardlinked to them. Workshops and shards sharing the cache each log
+    their own use, so nothing another recent run needs is removed.
+    """
+    if not max_age_days:
+        return
     
-    with open(config_path, 'r') as f:
-        return yaml.safe_load(f)
+    cache_dir = Path(os.path.abspath(cache_dir))
+    runs_dir = cache_dir / 'runs'
+    with _cache_used_lock:
+        used = [Path(os.path.abspath(path)) for path in _cache_used]
+    with atomic_open(runs_dir / f"{time.time():.0f}-{os.getpid()}.txt") as f:
+        f.write('\n'.join(sorted(str(path.relative_to(cache_dir)) for path in used if path.is_relative_to(cache_dir))))
+    
+    cutoff = time.time() - max_age_days * 86400
+    keep = set()
+    for log in runs_dir.glob('*.txt'):
+        if log.stat().st_mtime < cutoff:
+            log.unlink(missing_ok=True)
+        else:
+            keep.update(log.read_text().splitlines())
+    
+    removed = freed = 0
+    for entry in cache_dir.glob('*/*/*'):
+        relative = str(entry.relative_to(cache_dir))
+        # Recent entries may belong to a run that's still going
+        if relative in keep or entry.stat().st_mtime >= cutoff:
+            continue
+        if entry.is_dir():
+            freed += sum(path.stat().st_size for path in entry.rglob('*') if path.is_file())
+            shutil.rmtree(entry, ignore_errors=True)
+        else:
+            freed += entry.stat().st_size
+            entry.unlink(missing_ok=True)
+        removed += 1
+    if removed:
+        print(f"✓ Pruned {removed} cache entries unused for {max_age_days} days ({format_bytes(freed)})")
+
+def prune_caches(configs):
+    """Prune each distinct build cache once, with the age limit of the first config using it."""
+    cache_dirs = {}
+    for config in configs:
+        cache_dirs.setdefault(os.path.abspath(get_cache_dir(config)), config.get('cache_max_age_days', 30))
+    for cache_dir, max_age_days in cache_dirs.items():
+        prune_cache(cache_dir, max_age_days)
+
+def temp_path_for(path):
+    """A hidden temp path next to path, unique per process and thread."""
+    return path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+@contextmanager
+def atomic_open(path, mode='w'):
+    """Open path for writing through a temp file that replaces it once fully written.
+    
+    Readers see either the old file or the new one, never a partial write.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = temp_path_for(path)
+    try:
+        with open(tmp_path, mode) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+def write_cache_entry(path, data):
+    """Write a cache entry atomically so a crashed build never leaves a partial entry."""
+    with atomic_open(path, 'wb') as f:
+        f.write(data)
+
+def cached_json(cache_dir, kind, key, build):
+    """Return the cached JSON value for key, calling build() to create it on a miss.
+    
+    build() returns None when it failed; that isn't cached, so the next run retries.
+    """
+    entry = cache_entry(cache_dir, kind, key, '.json')
+    if entry.exists():
+        with open(entry) as f:
+            return json.load(f)
+    value = build()
+    if value is not None:
+        write_cache_entry(entry, json.dumps(value).encode('utf-8'))
+    return value
+
+# In-memory digests keyed on (path, size, mtime), shared by every worker thread
+_digest_memo = {}
+_digest_lock = threading.Lock()
+
+def file_digest(path, cache_dir=None):
+    """sha256 of a file's contents, memoized on its path, size and mtime."""
+    stat = os.stat(path)
+    stat_key = f"{Path(path).resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+    with _digest_lock:
+        if stat_key in _digest_memo:
+            return _digest_memo[stat_key]
+    
+    def compute():
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            while chunk := f.read(1024 * 1024):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    if cache_dir is None:
+        value = compute()
+    else:
+        value = cached_json(cache_dir, 'digests', fingerprint(stat_key, 64), compute)
+    with _digest_lock:
+        _digest_memo[stat_key] = value
+    return value
 
-def create_setup_cell(zip_name, config, install_packages="pandas natural_pdf tqdm", links=None):
-    """Create setup cell that works in Colab, Jupyter, etc."""
+def atomic_copy(source, dest):
+    """Copy source to dest via a temp file, so concurrent copies can't interleave."""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = temp_path_for(dest)
+    shutil.copy2(source, tmp_path)
+    os.replace(tmp_path, dest)
+
+def link_or_copy(source, dest):
+    """Hardlink source to dest (falling back to a copy across filesystems)."""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = temp_path_for(dest)
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copy2(source, tmp_path)
+    os.replace(tmp_path, dest)
+
+def copy_file(source, dest, cache_dir=None):
+    """Copy a file into the output through the content-addressed asset cache.
+    
+    The cache keeps its own copy (never a link to the source, which may be edited in
+    place); outputs are hardlinked to it, so workshops sharing an asset share the bytes.
+    """
+    if cache_dir is None:
+        atomic_copy(source, dest)
+        return
+    entry = cache_entry(cache_dir, 'assets', file_digest(source, cache_dir), Path(source).suffix)
+    if not entry.exists():
+        atomic_copy(source, entry)
+    link_or_copy(entry, dest)
+
+def format_bytes(size):
+    """Human-readable byte count."""
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if abs(size) < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+def create_setup_cell(zip_names, config, install_packages="pandas natural_pdf tqdm", links=None):
+    """Create setup cell that works in Colab, Jupyter, etc.
+    
+    Each zip is only downloaded if it hasn't already been extracted, so notebooks
+    sharing a data bundle don't download it twice.
+    """
     github_repo = config['github_repo']
     github_branch = config.get('github_branch', 'main')
     output_dir = config.get('output_dir', 'docs')
+    if isinstance(zip_names, str):
+        zip_names = [zip_names]
+    
+    sidecar_format = config.get('csv_sidecars')
+    imports = ['json', 'os', 'urllib.request', 'zipfile']
+    if config.get('dedupe'):
+        imports += ['glob', 'shutil']
+    if sidecar_format and 'glob' not in imports:
+        imports.append('glob')
     
     source_lines = [
         "# First we need to download some things!\n",
-        "# Run this cell to get the necessary data and software\n"
-        "import os\n",
-        "import urllib.request\n",
-        "import zipfile\n",
+        "# Run this cell to get the necessary data and software\n",
+        *[f"import {module}\n" for module in sorted(imports)],
         "\n",
         "# Install required packages\n",
         f"!pip install -q {install_packages}\n",
         "\n",
-        "# Download and extract data files\n",
-        f"url = 'https://github.com/{github_repo}/raw/{github_branch}/{output_dir}/{zip_name}'\n",
-        "print(f'Downloading data from {url}...')\n",
-        f"urllib.request.urlretrieve(url, '{zip_name}')\n",
-        "\n",
-        f"print('Extracting {zip_name}...')\n",
-        f"with zipfile.ZipFile('{zip_name}', 'r') as zip_ref:\n",
-        "    zip_ref.extractall('.')\n",
+        "# Download and extract data files. If an older version is already here,\n",
+        "# only download the files that changed since then.\n",
+        f"base_url = 'https://github.com/{github_repo}/raw/{github_branch}/{output_dir}/'\n",
+        f"for zip_name in {zip_names!r}:\n",
+        "    marker = f'.{zip_name}.extracted'\n",
+        "    have = open(marker).read().strip() if os.path.exists(marker) else None\n",
+        "    try:\n",
+        "        manifest = json.load(urllib.request.urlopen(base_url + zip_name[:-4] + '.manifest.json'))\n",
+        "    except Exception:\n",
+        "        manifest = {}\n",
+        "    latest = str(manifest.get('version', ''))\n",
+        "    if have is not None and (have == latest or not manifest):\n",
+        "        print(f'✓ {zip_name} already downloaded')\n",
+        "        continue\n",
+        "    delta = manifest.get('deltas', {}).get(have or '')\n",
+        "    download = delta or zip_name\n",
+        "    print(f'Downloading data from {base_url + download}...')\n",
+        "    urllib.request.urlretrieve(base_url + download, download)\n",
+        "    print(f'Extracting {download}...')\n",
+        "    with zipfile.ZipFile(download, 'r') as zip_ref:\n",
+        "        members = [name for name in zip_ref.namelist() if name != '.delta.json']\n",
+        "        zip_ref.extractall('.', members)\n",
+        "        if delta:\n",
+        "            for path in json.loads(zip_ref.read('.delta.json'))['removed']:\n",
+        "                if os.path.exists(path):\n",
+        "                    os.remove(path)\n",
+        "    os.remove(download)\n",
+        "    with open(marker, 'w') as f:\n",
+        "        f.write(latest)\n",
         "\n",
-        f"os.remove('{zip_name}')\n",
         "print('✓ Data files extracted!')"
     ]
     
+    # Recreate files that were stored once because they duplicate another file. copy2 keeps
+    # the original's mtime, so an alias whose size or mtime differs is stale after an update.
+    if config.get('dedupe'):
+        source_lines[-1] += "\n"
+        source_lines.extend([
+            "\n",
+            "for path in glob.glob('*.aliases.json'):\n",
+            "    with open(path) as f:\n",
+            "        for alias, original in json.load(f).items():\n",
+            "            if not os.path.exists(original):\n",
+            "                continue\n",
+            "            source = os.stat(original)\n",
+            "            if os.path.exists(alias):\n",
+            "                copy = os.stat(alias)\n",
+            "                if (copy.st_size, copy.st_mtime_ns) == (source.st_size, source.st_mtime_ns):\n",
+            "                    continue\n",
+            "            os.makedirs(os.path.dirname(alias) or '.', exist_ok=True)\n",
+            "            shutil.copy2(original, alias)"
+        ])
+    
+    # Let notebooks load the typed Parquet/Arrow copy of a CSV when there is one
+    if sidecar_format:
+        source_lines[-1] += "\n"
+        source_lines.extend([
+            "\n",
+            "fast_formats = {}\n",
+            "for path in glob.glob('*.datasets.json'):\n",
+            "    with open(path) as f:\n",
+            "        fast_formats.update(json.load(f))\n",
+            "\n",
+            "def read_data(path, **kwargs):\n",
+            "    \"\"\"Read a CSV, using its faster typed copy if one was downloaded.\n",
+            "\n",
+            "    With options like usecols or dtype, the original CSV is read with pd.read_csv.\n",
+            "    \"\"\"\n",
+            "    import pandas as pd\n",
+            "    sidecar = fast_formats.get(path, {}).get('path')\n",
+            "    if sidecar and os.path.exists(sidecar) and not kwargs:\n",
+            "        if sidecar.endswith('.parquet'):\n",
+            "            return pd.read_parquet(sidecar)\n",
+            "        import pyarrow.feather\n",
+            "        return pyarrow.feather.read_table(sidecar, memory_map=True).to_pandas()\n",
+            "    return pd.read_csv(path, **kwargs)"
+        ])
+    
     # Add links section if provided
     if links:
         source_lines.extend([
@@ -341,12 +774,12 @@ def process_notebook(notebook_path, output_dir, config, section_slides=None):
                 "outputs": []
             }
     
-    # Add setup cell if data files are specified
-    if metadata.get('data_files'):
-        zip_name = f"{base_name}-data.zip"
+    # Add setup cell if data files or shared bundles are specified
+    data_zips = get_item_data_zips(metadata, base_name, config, notebook_path)
+    if data_zips:
         install_packages = metadata.get('install', 'pandas natural_pdf tqdm')
         links = metadata.get('links', None)
-        setup_cell = create_setup_cell(zip_name, config, install_packages, links)
+        setup_cell = create_setup_cell(data_zips, config, install_packages, links)
         
         # Find first non-metadata cell position
         insert_pos = 0
@@ -357,16 +790,20 @@ def process_notebook(notebook_path, output_dir, config, section_slides=None):
         
         complete_nb['cells'].insert(insert_pos, setup_cell)
         exercise_nb['cells'].insert(insert_pos, setup_cell)
-        
+    
+    if metadata.get('data_files'):
         # Create data zip with paths relative to notebook directory
-        create_data_zip(metadata['data_files'], output_dir / zip_name, notebook_dir)
+        zip_name = f"{base_name}-data.zip"
+        create_data_zip(metadata['data_files'], output_dir / zip_name, notebook_dir, config)
     
     # Write output files
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
     
+    cache_dir = get_cache_dir(config)
+    
     # Copy any referenced files (PDFs, images) to output
-    find_and_copy_referenced_files(notebook, notebook_dir, output_dir)
+    find_and_copy_referenced_files(notebook, notebook_dir, output_dir, cache_dir)
     
     # Handle slides if specified (item-specific or section-level)
     slide_file = metadata.get('slides')
@@ -385,26 +822,25 @@ def process_notebook(notebook_path, output_dir, config, section_slides=None):
         source_pdf = notebook_dir / slide_file
         if not source_pdf.exists():
             # Try as absolute path from project root
-            source_pdf = Path(slide_file)
+            source_pdf = resolve_path(config, slide_file)
         if source_pdf.exists():
             dest_pdf = output_dir / slide_file
             if not dest_pdf.exists():
-                dest_pdf.parent.mkdir(parents=True, exist_ok=True)
-                shutil.copy2(source_pdf, dest_pdf)
+                copy_file(source_pdf, dest_pdf, cache_dir)
                 print(f"  → Copied slide file: {slide_file}")
         else:
             print(f"\n❌ ERROR: Slide file not found: {slide_file}")
             print(f"   Looked in: {notebook_dir / slide_file}")
-            print(f"   Also tried: {Path(slide_file)}")
+            print(f"   Also tried: {resolve_path(config, slide_file)}")
             sys.exit(1)
     
     # Exercise version keeps original name
-    with open(output_dir / f"{base_name}.ipynb", 'w') as f:
+    with atomic_open(output_dir / f"{base_name}.ipynb") as f:
         json.dump(exercise_nb, f, indent=1)
     print(f"✓ Created {output_dir / base_name}.ipynb")
     
     # Complete version gets -ANSWERS suffix
-    with open(output_dir / f"{base_name}-ANSWERS.ipynb", 'w') as f:
+    with atomic_open(output_dir / f"{base_name}-ANSWERS.ipynb") as f:
         json.dump(complete_nb, f, indent=1)
     print(f"✓ Created {output_dir / base_name}-ANSWERS.ipynb")
     
@@ -416,41 +852,945 @@ def process_notebook(notebook_path, output_dir, config, section_slides=None):
         'exercise_file': f"{base_name}.ipynb",
         'answers_file': f"{base_name}-ANSWERS.ipynb",
         'data_file': f"{base_name}-data.zip" if metadata.get('data_files') else None,
+        'data_bundles': get_bundle_zips(metadata.get('data_bundles', []), config, notebook_path),
         'section': notebook_dir.name,
         'order': metadata.get('order', None),
         'links': metadata.get('links', None),
         'slides': metadata.get('slides', None)
     }
 
-def create_data_zip(data_patterns, zip_path, base_dir):
-    """Create a zip file with files matching the patterns, relative to base_dir."""
-    with zipfile.ZipFile(zip_path, 'w') as zipf:
-        added_files = set()
+# Already-compressed formats: deflating them again costs CPU for ~0% gain
+STORED_EXTENSIONS = {
+    '.pdf', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.mov', '.mp4', '.webm', '.mp3',
+    '.zip', '.gz', '.bz2', '.xz', '.7z', '.br', '.parquet', '.arrow', '.xlsx', '.docx', '.pptx',
+}
+# Highly repetitive text compresses noticeably better at the top level
+TEXT_EXTENSIONS = {'.csv', '.tsv', '.txt', '.json', '.geojson', '.md', '.html', '.xml', '.ipynb'}
+
+ZIP_CHUNK_SIZE = 1024 * 1024
+# zlib's default, used when a zip member has no explicit level
+ZIP_DEFAULT_LEVEL = 6
+# Timestamp for every zip member, so the same content always zips to the same bytes
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+# Bump to invalidate cached zips when write_zip_member() changes
+ZIP_FORMAT_VERSION = 3
+
+def compression_policy(path, overrides=None):
+    """Return the zip compression level for a file, or None to store it uncompressed.
+    
+    overrides maps extensions to a level or 'store', e.g. {'.pdf': 6, '.csv': 'store'}.
+    """
+    ext = path.suffix.lower()
+    if overrides and ext in overrides:
+        level = overrides[ext]
+        return None if level == 'store' else int(level)
+    if ext in STORED_EXTENSIONS:
+        return None
+    if ext in TEXT_EXTENSIONS:
+        return 9
+    return 6
+
+def collect_data_files(data_patterns, base_dir):
+    """Expand data_files patterns into (file_path, arcname) pairs, relative to base_dir."""
+    files = []
+    added_files = set()
+    
+    for pattern in data_patterns:
+        # Resolve pattern relative to notebook directory
+        full_pattern = str(base_dir / pattern)
+        # glob() returns directory order, which differs between filesystems
+        matches = sorted(glob(full_pattern, recursive=True))
         
-        for pattern in data_patterns:
-            # Resolve pattern relative to notebook directory
-            full_pattern = str(base_dir / pattern)
-            matches = glob(full_pattern, recursive=True)
-            
-            if not matches:
-                print(f"  Warning: No files match pattern '{pattern}' in {base_dir}")
+        if not matches:
+            print(f"  Warning: No files match pattern '{pattern}' in {base_dir}")
+        
+        for file_path in matches:
+            file_path = Path(file_path)
+            # Calculate the archive name relative to the notebook's directory
+            try:
+                arcname = file_path.relative_to(base_dir)
+            except ValueError:
+                # If file is outside notebook dir, use full relative path
+                arcname = file_path
             
-            for file_path in matches:
-                file_path = Path(file_path)
-                # Calculate the archive name relative to the notebook's directory
-                try:
-                    arcname = file_path.relative_to(base_dir)
-                except ValueError:
-                    # If file is outside notebook dir, use full relative path
-                    arcname = file_path
-                
-                if str(file_path) not in added_files:
-                    zipf.write(file_path, str(arcname))
-                    added_files.add(str(file_path))
+            if str(file_path) not in added_files:
+                files.append((file_path, str(arcname)))
+                added_files.add(str(file_path))
+    
+    return files
+
+# Bump to invalidate cached sidecars when create_csv_sidecar() changes
+CSV_SIDECAR_VERSION = 1
+CSV_SIDECAR_EXTENSIONS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+def create_csv_sidecar(csv_path, sidecar_format, cache_dir):
+    """Convert a CSV to a typed Parquet/Arrow file in the cache, keyed by the CSV's hash.
+    
+    Returns (sidecar path, info dict), or (None, None) if the CSV can't be parsed.
+    """
+    suffix = CSV_SIDECAR_EXTENSIONS[sidecar_format]
+    key = f"{file_digest(csv_path, cache_dir)}-{pyarrow.__version__}-v{CSV_SIDECAR_VERSION}"
+    sidecar_path = cache_entry(cache_dir, 'sidecars', key, suffix)
+    
+    def convert():
+        # Schema inference happens once here, rather than in every notebook run
+        table = pyarrow.csv.read_csv(csv_path)
+        tmp_path = temp_path_for(sidecar_path)
+        tmp_path.parent.mkdir(parents=True, exist_ok=True)
+        if sidecar_format == 'parquet':
+            pyarrow.parquet.write_table(table, tmp_path, compression='zstd')
+        else:
+            # Uncompressed Arrow IPC can be memory-mapped straight from disk
+            pyarrow.feather.write_feather(table, tmp_path, compression='uncompressed')
+        os.replace(tmp_path, sidecar_path)
+        return {
+            'rows': table.num_rows,
+            'schema': {field.name: str(field.type) for field in table.schema},
+        }
+    
+    info_path = cache_entry(cache_dir, 'sidecars', key, '.json')
+    try:
+        if sidecar_path.exists() and info_path.exists():
+            with open(info_path) as f:
+                info = json.load(f)
+        else:
+            info = convert()
+            write_cache_entry(info_path, json.dumps(info).encode('utf-8'))
+    except (pyarrow.ArrowInvalid, UnicodeDecodeError) as e:
+        print(f"  ⚠ Could not convert {csv_path.name} to {sidecar_format}: {e}")
+        return None, None
+    return sidecar_path, info
+
+def create_csv_sidecars(files, zip_path, config):
+    """Build typed sidecars for every CSV in a data zip, plus a manifest describing them.
+    
+    Returns extra (file_path, arcname) pairs to add to the zip.
+    """
+    sidecar_format = config.get('csv_sidecars')
+    if sidecar_format not in CSV_SIDECAR_EXTENSIONS:
+        print(f"  ⚠ Unknown csv_sidecars format '{sidecar_format}' (use parquet or arrow)")
+        return []
+    if pyarrow is None:
+        print("  ⚠ pyarrow not installed, skipping CSV sidecars (pip install pyarrow)")
+        return []
+    
+    cache_dir = get_cache_dir(config)
+    csvs = [(file_path, arcname) for file_path, arcname in files if file_path.suffix.lower() == '.csv']
+    if not csvs:
+        return []
+    
+    pool = get_file_pool(get_worker_count(config))
+    results = list(pool.map(lambda entry: create_csv_sidecar(entry[0], sidecar_format, cache_dir), csvs))
+    
+    extra_files = []
+    datasets = {}
+    for (csv_path, arcname), (sidecar_path, info) in zip(csvs, results):
+        if sidecar_path is None:
+            continue
+        sidecar_arcname = str(Path(arcname).with_suffix(sidecar_path.suffix).as_posix())
+        extra_files.append((sidecar_path, sidecar_arcname))
+        datasets[Path(arcname).as_posix()] = {'path': sidecar_arcname, 'format': sidecar_format, **info}
+    
+    if not datasets:
+        return []
+    manifest = json.dumps(datasets, indent=1, sort_keys=True).encode('utf-8')
+    manifest_path = cache_entry(cache_dir, 'sidecars', fingerprint(manifest, 64), '.json')
+    if not manifest_path.exists():
+        write_cache_entry(manifest_path, manifest)
+    extra_files.append((manifest_path, f"{zip_path.stem}.datasets.json"))
+    print(f"  → Added {sidecar_format} copies of {len(datasets)} CSV files")
+    return extra_files
+
+# One process pool for all PDF work, shared by the zips building concurrently
+_process_pool = None
+_pools_lock = threading.Lock()
+
+def init_pdf_worker():
+    """Keep pypdf's warnings about malformed PDFs out of the publish output."""
+    logging.getLogger('pypdf').setLevel(logging.ERROR)
+
+def get_process_pool(workers):
+    """The shared spawn process pool, created with `workers` processes on first use."""
+    global _process_pool
+    with _pools_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_pdf_worker,
+            )
+        return _process_pool
+
+# One thread pool for per-file work (digests, sidecars, catalog entries) inside item and
+# bundle tasks; a pool per task would start workers² threads. Its own tasks never submit to it.
+_file_pool = None
+
+def get_file_pool(workers):
+    """The shared per-file thread pool, created with `workers` threads on first use."""
+    global _file_pool
+    with _pools_lock:
+        if _file_pool is None:
+            _file_pool = ThreadPoolExecutor(max_workers=workers)
+        return _file_pool
+
+def shutdown_pools():
+    """Stop the shared process and file pools, if they were started."""
+    global _process_pool, _file_pool
+    with _pools_lock:
+        for pool in (_process_pool, _file_pool):
+            if pool is not None:
+                pool.shutdown()
+        _process_pool = _file_pool = None
+
+# Entries whose fn() failed in this run: retried by the next publish, not by every zip in this one
+_failed_entries = set()
+
+def cache_in_processes(fn, paths, kind, keys, cache_dir, workers, label):
+    """Run fn(path) on a process pool for every path whose cached JSON result is missing.
+    
+    For pure-Python work like PDF parsing, where threads would serialize on the GIL.
+    Results of None (failures) aren't cached.
+    """
+    missing = [
+        (path, key) for path, key in zip(paths, keys)
+        if not cache_entry(cache_dir, kind, key, '.json').exists() and (kind, key) not in _failed_entries
+    ]
+    if not missing:
+        return
+    
+    print(f"  → {label} {len(missing)} new files...")
+    results = get_process_pool(workers).map(fn, [path for path, _ in missing], chunksize=8)
+    for (path, key), value in zip(missing, results):
+        if value is None:
+            _failed_entries.add((kind, key))
+        else:
+            write_cache_entry(cache_entry(cache_dir, kind, key, '.json'), json.dumps(value).encode('utf-8'))
+
+# Bump to invalidate cached PDF text when extract_pdf_text() changes
+PDF_TEXT_VERSION = 1
+
+def extract_pdf_text(path):
+    """Read a PDF's title and the text of each page, or None if it can't be read.
+    
+    This is the only full pypdf pass over a PDF: the catalog, search index and
+    duplicate detection all work from its cached result.
+    """
+    if pypdf is None:
+        return None
+    try:
+        reader = pypdf.PdfReader(path)
+        title = str((reader.metadata or {}).get('/Title') or '').strip()
+        return {
+            'title': title or None,
+            'pages': [page.extract_text() or '' for page in reader.pages],
+        }
+    except Exception as e:
+        print(f"  ⚠ Could not read {path.name}: {e}")
+        return None
+
+def pdf_text_key(path, cache_dir):
+    return f"{file_digest(path, cache_dir)}-v{PDF_TEXT_VERSION}-pypdf{PYPDF_VERSION}"
+
+def extract_pdf_texts(paths, cache_dir, workers):
+    """Extract the text of every PDF in paths that isn't in the cache yet."""
+    pdf_paths = sorted({path for path in paths if path.suffix.lower() == '.pdf'})
+    keys = [pdf_text_key(path, cache_dir) for path in pdf_paths]
+    cache_in_processes(extract_pdf_text, pdf_paths, 'pdf-text', keys, cache_dir, workers, "Extracting text from")
+
+def cached_pdf_text(path, cache_dir):
+    """A PDF's text from extract_pdf_texts(), or None if it couldn't be read."""
+    return cached_json(cache_dir, 'pdf-text', pdf_text_key(path, cache_dir), lambda: None)
+
+# Bump to invalidate cached signatures when pdf_signature() changes
+PDF_SIGNATURE_VERSION = 2
+SHINGLE_WORDS = 5
+MINHASH_SIZE = 128
+# LSH banding: 16 bands of 8 rows makes pairs above ~0.7 similarity candidates
+LSH_BANDS = 16
+# Pairs at least this similar are listed in the dedup report even when both are kept
+SIMILARITY_REPORT_THRESHOLD = 0.8
+
+def pdf_signature(text):
+    """Fingerprint extracted PDF text: a hash of the normalized text plus a MinHash of word shingles.
+    
+    One-permutation MinHash: each shingle is hashed once, the hash picks one of
+    MINHASH_SIZE bins, and each bin keeps its minimum (None if no shingle landed
+    there). The bins act as MINHASH_SIZE independent hash functions.
+    """
+    words = re.findall(SEARCH_TOKEN_PATTERN, ' '.join(text['pages']).lower())
+    if not words:
+        return {'text_hash': None, 'minhash': []}
+    shingles = {' '.join(words[i:i + SHINGLE_WORDS]) for i in range(max(len(words) - SHINGLE_WORDS + 1, 1))}
+    minhash = [None] * MINHASH_SIZE
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        slot = value % MINHASH_SIZE
+        value //= MINHASH_SIZE
+        if minhash[slot] is None or value < minhash[slot]:
+            minhash[slot] = value
+    return {
+        'text_hash': hashlib.sha256(' '.join(words).encode('utf-8')).hexdigest(),
+        'minhash': minhash,
+    }
+
+def minhash_similarity(a, b):
+    """Estimate the Jaccard similarity of two shingle sets from their MinHashes."""
+    filled = [(x, y) for x, y in zip(a, b) if x is not None or y is not None]
+    if not filled:
+        return 0.0
+    return sum(1 for x, y in filled if x == y) / len(filled)
+
+def lsh_candidates(signatures):
+    """Pairs of signature indexes that share a whole LSH band, or have identical text.
+    
+    Only these pairs are compared, so the work grows with the number of similar
+    documents rather than with every pair in the corpus.
+    """
+    rows = MINHASH_SIZE // LSH_BANDS
+    buckets = {}
+    for i, signature in enumerate(signatures):
+        if signature['text_hash'] is not None:
+            buckets.setdefault(('text', signature['text_hash']), []).append(i)
+        for band in range(LSH_BANDS):
+            values = tuple(signature['minhash'][band * rows:(band + 1) * rows])
+            # Bands with empty bins (very short texts) would match too loosely
+            if len(values) == rows and None not in values:
+                buckets.setdefault((band, values), []).append(i)
+    return sorted({
+        (members[a], members[b])
+        for members in buckets.values()
+        for a in range(len(members)) for b in range(a + 1, len(members))
+    })
+
+def find_duplicate_files(files, config):
+    """Group duplicate data files: exact (same bytes) and, if enabled, near (similar PDF text).
+    
+    Returns (groups, similar): groups is a list of (kind, [file entries]) to store once,
+    similar lists pairs that are alike but below near_duplicate_threshold.
+    """
+    cache_dir = get_cache_dir(config)
+    threshold = config.get('near_duplicate_threshold')
+    files = [entry for entry in files if entry[0].is_file()]
+    
+    pool = get_file_pool(get_worker_count(config))
+    digests = list(pool.map(lambda entry: file_digest(entry[0], cache_dir), files))
+    
+    parent = list(range(len(files)))
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    
+    first_by_digest = {}
+    for i, digest in enumerate(digests):
+        if digest in first_by_digest:
+            parent[find(i)] = find(first_by_digest[digest])
+        else:
+            first_by_digest[digest] = i
+    
+    # Same text doesn't mean same file (stamps, signatures, scanned pages), so this is opt-in
+    similar = []
+    pdf_ids = []
+    if threshold is not None:
+        # Near-duplicates are only looked for among distinct PDFs whose text could be read
+        pdf_ids = [i for i in first_by_digest.values() if files[i][0].suffix.lower() == '.pdf']
+        extract_pdf_texts([files[i][0] for i in pdf_ids], cache_dir, get_worker_count(config))
+    
+    def build_signature(path):
+        text = cached_pdf_text(path, cache_dir)
+        return None if text is None else pdf_signature(text)
+    
+    signed_ids = []
+    signatures = []
+    for i in pdf_ids:
+        key = f"{pdf_text_key(files[i][0], cache_dir)}-s{PDF_SIGNATURE_VERSION}"
+        value = cached_json(cache_dir, 'pdf-signatures', key, lambda: build_signature(files[i][0]))
+        if value is not None:
+            signed_ids.append(i)
+            signatures.append(value)
+    pdf_ids = signed_ids
+    
+    for a, b in lsh_candidates(signatures):
+        text_hash = signatures[a]['text_hash']
+        same_text = text_hash is not None and text_hash == signatures[b]['text_hash']
+        similarity = 1.0 if same_text else minhash_similarity(signatures[a]['minhash'], signatures[b]['minhash'])
+        # Only identical text counts as 1.0, so a threshold of 1.0 never merges different documents
+        if similarity >= threshold and (same_text or threshold < 1.0):
+            parent[find(pdf_ids[a])] = find(pdf_ids[b])
+        elif similarity >= SIMILARITY_REPORT_THRESHOLD:
+            similar.append((files[pdf_ids[a]][1], files[pdf_ids[b]][1], round(similarity, 3)))
+    
+    members = {}
+    for i in range(len(files)):
+        members.setdefault(find(i), []).append(i)
+    groups = [
+        ('exact' if len({digests[i] for i in ids}) == 1 else 'near', [files[i] for i in ids])
+        for ids in members.values() if len(ids) > 1
+    ]
+    return groups, similar
+
+def dedupe_data_files(files, zip_path, config):
+    """Store each duplicate file once, recording the other copies as aliases.
+    
+    Returns (kept files, extra files, aliases). The extra <name>.aliases.json goes into
+    the zip so the setup cell can recreate the alias copies; <name>.dedup.json is
+    written next to the zip as a report.
+    """
+    groups, similar = find_duplicate_files(files, config)
+    
+    aliases = {}
+    report = {'exact': [], 'near': [], 'bytes_saved': 0}
+    for kind, entries in groups:
+        # Prefer the plainest name, e.g. "x (87).pdf" over "x_1 (87).pdf"
+        entries = sorted(entries, key=lambda entry: (len(entry[1]), entry[1]))
+        canonical = entries[0][1]
+        for file_path, arcname in entries[1:]:
+            aliases[arcname] = canonical
+            report['bytes_saved'] += file_path.stat().st_size
+        report[kind].append({'kept': canonical, 'aliases': [arcname for _, arcname in entries[1:]]})
+    report['similar'] = [{'a': a, 'b': b, 'similarity': similarity} for a, b, similarity in similar]
+    
+    with atomic_open(zip_path.with_name(f"{zip_path.stem}.dedup.json")) as f:
+        json.dump(report, f, indent=1, sort_keys=True)
+    
+    if not aliases:
+        return files, [], {}
+    
+    manifest = json.dumps(dict(sorted(aliases.items())), indent=1).encode('utf-8')
+    manifest_path = cache_entry(get_cache_dir(config), 'aliases', fingerprint(manifest, 64), '.json')
+    if not manifest_path.exists():
+        write_cache_entry(manifest_path, manifest)
+    print(f"  → Stored {len(aliases)} duplicate files once ({len(report['exact'])} exact groups, "
+          f"{len(report['near'])} near-duplicate groups), saving {format_bytes(report['bytes_saved'])}")
+    kept = [(file_path, arcname) for file_path, arcname in files if arcname not in aliases]
+    return kept, [(manifest_path, f"{zip_path.stem}.aliases.json")], aliases
+
+def write_zip_member(zipf, file_path, arcname, level):
+    """Add a file (or directory) with a fixed timestamp and permissions.
+    
+    zipf.write() would record the source's mtime, which differs between checkouts,
+    so the same content would zip to different bytes on every CI runner. Files are
+    streamed in chunks, with ZIP64 headers when they need them.
+    """
+    if file_path.is_dir():
+        zinfo = zipfile.ZipInfo(f"{arcname.rstrip('/')}/", ZIP_DATE_TIME)
+        zinfo.external_attr = 0o40755 << 16
+        zipf.writestr(zinfo, b'')
+        return
+    zinfo = zipfile.ZipInfo(arcname, ZIP_DATE_TIME)
+    zinfo.external_attr = 0o100644 << 16
+    zinfo.compress_type = zipfile.ZIP_STORED if level is None else zipfile.ZIP_DEFLATED
+    
+    # ZipInfo only takes a compression level publicly from Python 3.13 (compress_level);
+    # before that, only the default level can be streamed
+    if level is not None and level != ZIP_DEFAULT_LEVEL and not hasattr(zinfo, 'compress_level'):
+        zipf.writestr(zinfo, file_path.read_bytes(), compresslevel=level)
+        return
+    if level is not None and hasattr(zinfo, 'compress_level'):
+        zinfo.compress_level = level
+    # Like zipfile itself, leave room for deflate growing incompressible data
+    size = file_path.stat().st_size
+    with open(file_path, 'rb') as src, zipf.open(zinfo, 'w', force_zip64=size * 1.05 > zipfile.ZIP64_LIMIT) as dst:
+        shutil.copyfileobj(src, dst, ZIP_CHUNK_SIZE)
+
+def create_data_zip(data_patterns, zip_path, base_dir, config=None):
+    """Create a zip file with files matching the patterns, relative to base_dir.
+    
+    Members are compressed according to compression_policy(); already-compressed
+    formats are stored as-is. Separate zips build concurrently on the caller's pool.
+    """
+    config = config or {}
+    overrides = config.get('zip_compression')
+    cache_dir = get_cache_dir(config)
+    files = collect_data_files(data_patterns, base_dir)
+    aliases = {}
+    if config.get('dedupe'):
+        files, alias_files, aliases = dedupe_data_files(files, zip_path, config)
+        files += alias_files
+    if config.get('csv_sidecars'):
+        files += create_csv_sidecars(files, zip_path, config)
+    if config.get('search_index'):
+        files += create_search_index(files, zip_path, config)
+    levels = [None if file_path.is_dir() else compression_policy(file_path, overrides) for file_path, _ in files]
+    
+    # Identical inputs (by content) give an identical zip, which may already be cached
+    digests = get_file_pool(get_worker_count(config)).map(
+        lambda entry: None if entry[0].is_dir() else file_digest(entry[0], cache_dir), files
+    )
+    zip_key = fingerprint(json.dumps([ZIP_FORMAT_VERSION] + [
+        [arcname, digest, level] for (_, arcname), digest, level in zip(files, digests, levels)
+    ]), 64)
+    entry = cache_entry(cache_dir, 'zips', zip_key, '.zip')
+    if entry.exists():
+        link_or_copy(entry, zip_path)
+        print(f"✓ Reused cached {zip_path.name} with {len(files)} files ({format_bytes(zip_path.stat().st_size)})")
+    else:
+        with atomic_open(zip_path, 'wb') as f, zipfile.ZipFile(f, 'w', allowZip64=True) as zipf:
+            for (file_path, arcname), level in zip(files, levels):
+                write_zip_member(zipf, file_path, arcname, level)
+        link_or_copy(zip_path, entry)
+        print(f"✓ Created {zip_path.name} with {len(files)} files ({format_bytes(zip_path.stat().st_size)})")
+    
+    if config.get('data_catalog', True):
+        create_data_catalog(files, zip_path, config, aliases)
+
+def bundle_zip_name(bundle_name):
+    """Filename of a shared data bundle's zip."""
+    return f"{bundle_name}-bundle.zip"
+
+def get_bundle_zips(bundle_names, config, item_path):
+    """Map an item's data_bundles names to zip filenames, failing on undefined bundles."""
+    bundles = config.get('data_bundles') or {}
+    for name in bundle_names:
+        if name not in bundles:
+            print(f"\n❌ ERROR: {item_path} uses data bundle '{name}', which isn't defined")
+            print(f"   Defined bundles: {', '.join(bundles) or '(none)'}")
+            sys.exit(1)
+    return [bundle_zip_name(name) for name in bundle_names]
+
+def get_item_data_zips(metadata, base_name, config, item_path):
+    """All zips an item needs: its own data_files zip, then any shared bundles."""
+    data_zips = []
+    if metadata.get('data_files'):
+        data_zips.append(f"{base_name}-data.zip")
+    data_zips.extend(get_bundle_zips(metadata.get('data_bundles', []), config, item_path))
+    return data_zips
+
+def build_data_bundles(config, output_dir, executor=None, names=None):
+    """Build each shared data bundle from the config once, however many items use it.
+    
+    With an executor, bundles are submitted to it and the futures returned. names
+    restricts the build to those bundles (used by sharded builds).
+    """
+    futures = []
+    for name, bundle in (config.get('data_bundles') or {}).items():
+        if names is not None and name not in names:
+            continue
+        print(f"\nBuilding data bundle {name}")
+        base_dir = resolve_path(config, bundle.get('folder', '.'))
+        args = (bundle['files'], output_dir / bundle_zip_name(name), base_dir, config)
+        if executor is None:
+            create_data_zip(*args)
+        else:
+            futures.append(executor.submit(create_data_zip, *args))
+    return futures
+
+def zip_file_hashes(zip_path):
+    """Map each file in a zip to the sha256 of its contents."""
+    hashes = {}
+    with zipfile.ZipFile(zip_path) as zipf:
+        for info in zipf.infolist():
+            if info.is_dir():
+                continue
+            digest = hashlib.sha256()
+            with zipf.open(info) as f:
+                while chunk := f.read(ZIP_CHUNK_SIZE):
+                    digest.update(chunk)
+            hashes[info.filename] = digest.hexdigest()
+    return hashes
+
+def load_data_manifests(output_dir):
+    """Read data zip manifests from the previous publish (call before output_dir is cleaned)."""
+    manifests = {}
+    for path in Path(output_dir).glob('*.manifest.json'):
+        try:
+            with open(path) as f:
+                manifest = json.load(f)
+            manifests[manifest['zip']] = manifest
+        except (ValueError, KeyError):
+            print(f"  ⚠ Ignoring unreadable manifest: {path.name}")
+    return manifests
+
+def create_delta_zip(zip_path, delta_path, changed, removed):
+    """Zip just the changed files from zip_path, plus a .delta.json listing removed files."""
+    with zipfile.ZipFile(zip_path) as source, atomic_open(delta_path, 'wb') as f, \
+            zipfile.ZipFile(f, 'w', allowZip64=True) as delta:
+        for name in changed:
+            info = source.getinfo(name)
+            zinfo = zipfile.ZipInfo(name, info.date_time)
+            zinfo.compress_type = info.compress_type
+            zinfo.external_attr = info.external_attr
+            with source.open(info) as src, delta.open(zinfo, 'w', force_zip64=info.file_size > zipfile.ZIP64_LIMIT) as dst:
+                shutil.copyfileobj(src, dst, ZIP_CHUNK_SIZE)
+        delta.writestr(zipfile.ZipInfo('.delta.json', ZIP_DATE_TIME), json.dumps({'removed': removed}))
+
+def create_data_manifests(output_dir, previous_manifests, config, live_dir=None):
+    """Version every data zip and write deltas from recent earlier versions.
+    
+    Each <name>.manifest.json records the zip's version, the hash of every file, and
+    <name>.delta-<old>-<new>.zip archives holding only what changed since <old>.
+    The notebook setup cell uses these to update an existing download in place.
+    Deltas the previous publish already shipped are reused from live_dir.
+    """
+    keep = config.get('delta_history', 5)
+    zip_paths = sorted(path for path in output_dir.glob('*.zip') if '.delta-' not in path.name)
+    
+    cache_dir = get_cache_dir(config)
+    
+    def hash_zip(zip_path):
+        return cached_json(cache_dir, 'zip-contents', file_digest(zip_path, cache_dir), lambda: zip_file_hashes(zip_path))
+    
+    with ThreadPoolExecutor(max_workers=get_worker_count(config)) as executor:
+        all_hashes = list(executor.map(hash_zip, zip_paths))
+    
+    for zip_path, files in zip(zip_paths, all_hashes):
+        previous = previous_manifests.get(zip_path.name)
+        if previous is None:
+            version, history = 1, []
+        elif previous['files'] == files:
+            version, history = previous['version'], previous.get('history', [])
+        else:
+            version = previous['version'] + 1
+            history = previous.get('history', []) + [{'version': previous['version'], 'files': previous['files']}]
+            history = history[-keep:] if keep else []
+        
+        deltas = {}
+        for old in history:
+            changed = sorted(name for name, digest in files.items() if old['files'].get(name) != digest)
+            removed = sorted(name for name in old['files'] if name not in files)
+            delta_name = f"{zip_path.stem}.delta-{old['version']}-{version}.zip"
+            shipped = live_dir / delta_name if live_dir else None
+            if shipped and previous.get('deltas', {}).get(str(old['version'])) == delta_name and shipped.exists():
+                link_or_copy(shipped, output_dir / delta_name)
+            else:
+                create_delta_zip(zip_path, output_dir / delta_name, changed, removed)
+            deltas[str(old['version'])] = delta_name
         
-        print(f"✓ Created {zip_path.name} with {len(added_files)} files")
+        manifest = {
+            'zip': zip_path.name,
+            'version': version,
+            'files': files,
+            'deltas': deltas,
+            'history': history,
+        }
+        with atomic_open(output_dir / f"{zip_path.stem}.manifest.json") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        print(f"✓ {zip_path.name} is version {version} ({len(deltas)} delta archives)")
+
+CATALOG_THUMB_WIDTH = 200
+
+def catalog_name(zip_name):
+    """Filename of the catalog page describing a data zip."""
+    return f"{Path(zip_name).stem}.catalog.html"
+
+def dedupe_note(config):
+    """Tell people unzipping a download by hand where the duplicates went, or '' without dedupe."""
+    if not config.get('dedupe'):
+        return ''
+    return ('<br><small>Identical files are stored once; the <code>.aliases.json</code> file in '
+            'each zip lists their other names.</small>')
+
+def catalog_link(zip_name, config):
+    """HTML link to a data zip's catalog, or '' when catalogs are disabled."""
+    if not config.get('data_catalog', True):
+        return ''
+    return f' (<a href="./{catalog_name(zip_name)}">what\'s inside</a>)'
+
+def describe_pdf(path, cache_dir):
+    """Page count, title and whether a PDF has a text layer or is a scan, from its extracted text."""
+    text = cached_pdf_text(path, cache_dir)
+    if text is None:
+        pages = None
+        if pypdf is None:
+            # Rough fallback: count page objects in the raw bytes
+            pages = len(re.findall(rb'/Type\s*/Page(?![a-zA-Z])', path.read_bytes())) or None
+        return {'pages': pages, 'title': None, 'text': 'unknown'}
+    
+    # A few pages is enough to tell a text PDF from a scan
+    sample = ''.join(text['pages'][:3])
+    return {
+        'pages': len(text['pages']),
+        'title': text['title'],
+        'text': 'text' if len(sample.strip()) >= 50 else 'scanned',
+    }
+
+def catalog_entry(file_path, arcname, output_dir, thumb_dir, cache_dir):
+    """Describe one data file for the catalog, reusing cached scans and thumbnails."""
+    entry = {
+        'name': arcname,
+        'size': file_path.stat().st_size,
+        'type': file_path.suffix.lstrip('.').upper() or 'file',
+        'pages': None,
+        'title': None,
+        'text': None,
+        'thumb': None,
+    }
+    if file_path.suffix.lower() != '.pdf':
+        return entry
+    
+    digest = file_digest(file_path, cache_dir)
+    entry.update(describe_pdf(file_path, cache_dir))
+    
+    thumb_cache = cache_entry(cache_dir, 'thumbnails', f"{digest}-{CATALOG_THUMB_WIDTH}", '.png')
+    thumb_path = thumb_dir / f"{digest[:16]}.png"
+    if thumb_cache.exists():
+        link_or_copy(thumb_cache, thumb_path)
+    elif render_pdf_thumbnail(file_path, thumb_path, CATALOG_THUMB_WIDTH):
+        atomic_copy(thumb_path, thumb_cache)
+    if thumb_path.exists():
+        entry['thumb'] = thumb_path.relative_to(output_dir).as_posix()
+    return entry
+
+def catalog_rows(entries):
+    """Render catalog entries as table rows."""
+    rows = []
+    for entry in entries:
+        thumb = f'<img src="./{entry["thumb"]}" alt="" loading="lazy">' if entry['thumb'] else ''
+        if entry['text'] == 'scanned':
+            text = '<span class="scanned">scanned</span>'
+        else:
+            text = entry['text'] or ''
+        name = html.escape(entry['name'])
+        if entry.get('alias_of'):
+            name += f"<br><small>stored once as {html.escape(entry['alias_of'])}</small>"
+        rows.append(
+            f"<tr><td>{thumb}</td>"
+            f"<td>{name}</td>"
+            f"<td>{html.escape(entry['title'] or '')}</td>"
+            f"<td>{html.escape(entry['type'])}</td>"
+            f"<td>{format_bytes(entry['size'])}</td>"
+            f"<td>{entry['pages'] or ''}</td>"
+            f"<td>{text}</td></tr>"
+        )
+    return ''.join(rows)
+
+def create_data_catalog(files, zip_path, config, aliases=None):
+    """Write <name>.catalog.html listing what's inside a data zip.
+    
+    PDF text is extracted in parallel (cached by file hash). Files stored once by
+    dedupe are listed under every name they have. The first page of rows is in the
+    HTML; the rest are JSON pages loaded as the reader scrolls.
+    """
+    output_dir = zip_path.parent
+    cache_dir = get_cache_dir(config)
+    page_size = config.get('catalog_page_size', 50)
+    catalog_dir = output_dir / 'catalog' / zip_path.stem
+    thumb_dir = catalog_dir / 'thumbs'
+    thumb_dir.mkdir(parents=True, exist_ok=True)
+    
+    files = sorted((file_path, arcname) for file_path, arcname in files if file_path.is_file())
+    extract_pdf_texts([file_path for file_path, _ in files], cache_dir, get_worker_count(config))
+    entries = list(get_file_pool(get_worker_count(config)).map(
+        lambda entry: catalog_entry(entry[0], entry[1], output_dir, thumb_dir, cache_dir), files
+    ))
+    if aliases:
+        by_name = {entry['name']: entry for entry in entries}
+        entries += [
+            {**by_name[original], 'name': alias, 'alias_of': original}
+            for alias, original in aliases.items() if original in by_name
+        ]
+        entries.sort(key=lambda entry: entry['name'])
+    
+    pages = [entries[i:i + page_size] for i in range(0, len(entries), page_size)] or [[]]
+    page_urls = [None] + [f"./catalog/{zip_path.stem}/page-{i + 1}.json" for i in range(1, len(pages))]
+    for i in range(1, len(pages)):
+        next_url = page_urls[i + 1] if i + 1 < len(pages) else None
+        with atomic_open(catalog_dir / f"page-{i + 1}.json") as f:
+            json.dump({'rows': catalog_rows(pages[i]), 'next': next_url}, f)
+    
+    pdfs = [entry for entry in entries if entry['pages'] is not None]
+    scanned = sum(1 for entry in pdfs if entry['text'] == 'scanned')
+    summary = f"{len(entries)} files, {format_bytes(sum(entry['size'] for entry in entries))}"
+    if pdfs:
+        summary += f" · {len(pdfs)} PDFs, {sum(entry['pages'] for entry in pdfs)} pages, {scanned} scanned"
+    if aliases:
+        summary += f" · {len(aliases)} duplicates stored once"
+    
+    more_button = ''
+    if len(pages) > 1:
+        more_button = f'<p><button class="catalog-more" data-next="{page_urls[1]}" onclick="loadCatalogPage(this)">Load more</button></p>'
+    body = f"""<h1>{html.escape(zip_path.name)}</h1>
+<p>{summary} · <a href="./{zip_path.name}">📦 Download {html.escape(zip_path.name)}</a></p>
+<div class="catalog">
+<table>
+<thead><tr><th></th><th>File</th><th>Title</th><th>Type</th><th>Size</th><th>Pages</th><th>Text</th></tr></thead>
+<tbody>{catalog_rows(pages[0])}</tbody>
+</table>
+{more_button}
+</div>"""
+    with atomic_open(output_dir / catalog_name(zip_path.name)) as f:
+        f.write(html_page(body, f"{zip_path.name} contents"))
+    print(f"✓ Created {catalog_name(zip_path.name)} ({summary})")
+
+# Bump to invalidate cached indexes when the search code below changes
+SEARCH_INDEX_VERSION = 1
+SEARCH_DOCUMENT_EXTENSIONS = {'.pdf', '.txt', '.md'}
+SEARCH_CHUNK_WORDS = 200
+SEARCH_TOKEN_PATTERN = r"\w+"
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Shipped inside data zips as bm25_search.py; must tokenize exactly like the publisher
+SEARCH_HELPER = '''"""
+Search the documents in this data download.
+
+    from bm25_search import search
+    for hit in search("outdoor dining heaters"):
+        print(round(hit['score'], 1), hit['doc'], hit['page'], hit['text'][:200])
+"""
+import glob
+import json
+import os
+import re
+
+import numpy as np
+
+TOKEN = re.compile(r"{token_pattern}")
+_indexes = None
+
+def _load():
+    indexes = []
+    for path in sorted(glob.glob('*.search')):
+        with open(os.path.join(path, 'vocab.json')) as f:
+            vocab = json.load(f)
+        with open(os.path.join(path, 'chunks.json')) as f:
+            chunks = json.load(f)
+        arrays = [np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+                  for name in ('indptr', 'chunk_ids', 'weights')]
+        indexes.append((vocab, chunks, *arrays))
+    return indexes
+
+def search(query, k=5):
+    """Return the k chunks that best match the query (BM25), best first."""
+    global _indexes
+    if _indexes is None:
+        _indexes = _load()
+    hits = []
+    for vocab, chunks, indptr, chunk_ids, weights in _indexes:
+        scores = np.zeros(len(chunks), dtype=np.float32)
+        for term in set(TOKEN.findall(query.lower())):
+            if term in vocab:
+                start, end = indptr[vocab[term]], indptr[vocab[term] + 1]
+                scores[chunk_ids[start:end]] += weights[start:end]
+        top = np.argpartition(-scores, min(k, len(scores) - 1))[:k] if len(scores) else []
+        hits.extend(dict(chunks[i], score=float(scores[i])) for i in top if scores[i] > 0)
+    return sorted(hits, key=lambda hit: -hit['score'])[:k]
+'''.replace('{token_pattern}', SEARCH_TOKEN_PATTERN)
+
+def extract_document_chunks(path, cache_dir):
+    """Split a document's text into ~SEARCH_CHUNK_WORDS-word chunks with their term counts.
+    
+    PDFs use the text from extract_pdf_texts(); returns None if it couldn't be read.
+    """
+    if path.suffix.lower() == '.pdf':
+        text = cached_pdf_text(path, cache_dir)
+        if text is None:
+            return None
+        pages = list(enumerate(text['pages'], 1))
+    else:
+        pages = [(None, path.read_text(encoding='utf-8', errors='replace'))]
+    
+    chunks = []
+    for page, text in pages:
+        words = text.split()
+        for i in range(0, len(words), SEARCH_CHUNK_WORDS):
+            chunk = ' '.join(words[i:i + SEARCH_CHUNK_WORDS])
+            terms = Counter(re.findall(SEARCH_TOKEN_PATTERN, chunk.lower()))
+            if terms:
+                chunks.append({'page': page, 'text': chunk, 'terms': dict(terms)})
+    return chunks
+
+def write_search_index(documents, index_dir):
+    """Write a BM25 index over [(arcname, chunks)] as memory-mappable numpy arrays.
+    
+    Term-major CSR layout: postings for term t are chunk_ids/weights[indptr[t]:indptr[t+1]],
+    with the full BM25 weight precomputed, so a query is a few slices and adds.
+    """
+    chunk_meta = []
+    lengths = []
+    postings = {}
+    for arcname, chunks in documents:
+        for chunk in chunks:
+            chunk_id = len(chunk_meta)
+            chunk_meta.append({'doc': arcname, 'page': chunk['page'], 'text': chunk['text']})
+            lengths.append(sum(chunk['terms'].values()))
+            for term, count in chunk['terms'].items():
+                postings.setdefault(term, []).append((chunk_id, count))
+    
+    lengths = numpy.array(lengths, dtype=numpy.float32)
+    average_length = float(lengths.mean()) if len(lengths) else 1.0
+    terms = sorted(postings)
+    indptr = numpy.zeros(len(terms) + 1, dtype=numpy.int64)
+    chunk_ids = []
+    weights = []
+    for term_id, term in enumerate(terms):
+        ids = numpy.array([chunk_id for chunk_id, _ in postings[term]], dtype=numpy.int32)
+        counts = numpy.array([count for _, count in postings[term]], dtype=numpy.float32)
+        idf = math.log(1 + (len(chunk_meta) - len(ids) + 0.5) / (len(ids) + 0.5))
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[ids] / average_length)
+        chunk_ids.append(ids)
+        weights.append(idf * counts * (BM25_K1 + 1) / (counts + norm))
+        indptr[term_id + 1] = indptr[term_id] + len(ids)
+    
+    index_dir.mkdir(parents=True, exist_ok=True)
+    numpy.save(index_dir / 'indptr.npy', indptr)
+    numpy.save(index_dir / 'chunk_ids.npy', numpy.concatenate(chunk_ids) if chunk_ids else numpy.zeros(0, numpy.int32))
+    numpy.save(index_dir / 'weights.npy', numpy.concatenate(weights).astype(numpy.float32) if weights else numpy.zeros(0, numpy.float32))
+    with open(index_dir / 'vocab.json', 'w') as f:
+        json.dump({term: term_id for term_id, term in enumerate(terms)}, f, ensure_ascii=False)
+    with open(index_dir / 'chunks.json', 'w') as f:
+        json.dump(chunk_meta, f, ensure_ascii=False)
+    return len(chunk_meta), len(terms)
 
-def find_and_copy_referenced_files(notebook, notebook_dir, output_dir):
+def create_search_index(files, zip_path, config):
+    """Build a BM25 index over the PDFs and text files going into a data zip.
+    
+    Chunks are extracted per document in parallel and cached by file hash, so adding
+    a PDF only extracts that PDF. Returns extra (file_path, arcname) pairs for the zip:
+    the <name>.search/ index and the bm25_search.py query helper.
+    """
+    if numpy is None:
+        print("  ⚠ numpy not installed, skipping search index (pip install numpy)")
+        return []
+    if pypdf is None:
+        print("  ⚠ pypdf not installed, PDFs won't be searchable (pip install pypdf)")
+    
+    cache_dir = get_cache_dir(config)
+    documents = sorted(
+        (arcname, file_path) for file_path, arcname in files
+        if file_path.is_file() and file_path.suffix.lower() in SEARCH_DOCUMENT_EXTENSIONS
+    )
+    if not documents:
+        return []
+    
+    extract_pdf_texts([path for _, path in documents], cache_dir, get_worker_count(config))
+    keys = [pdf_text_key(path, cache_dir) for _, path in documents]
+    
+    # PDFs that couldn't be read are left out; once they can be, the index key changes
+    extracted = [
+        path.suffix.lower() != '.pdf' or cache_entry(cache_dir, 'pdf-text', key, '.json').exists()
+        for (_, path), key in zip(documents, keys)
+    ]
+    index_key = fingerprint(json.dumps([SEARCH_INDEX_VERSION] + [
+        [arcname, key, ok] for (arcname, _), key, ok in zip(documents, keys, extracted)
+    ]), 64)
+    index_dir = cache_entry(cache_dir, 'search', index_key)
+    if not (index_dir / 'chunks.json').exists():
+        chunks = [extract_document_chunks(path, cache_dir) or [] for _, path in documents]
+        tmp_dir = temp_path_for(index_dir)
+        chunk_count, term_count = write_search_index(
+            [(arcname, doc_chunks) for (arcname, _), doc_chunks in zip(documents, chunks)], tmp_dir
+        )
+        try:
+            os.replace(tmp_dir, index_dir)
+        except OSError:
+            # Another workshop built the same index first
+            shutil.rmtree(tmp_dir)
+        print(f"  → Indexed {chunk_count} chunks ({term_count} terms) from {len(documents)} documents")
+    
+    helper_path = cache_entry(cache_dir, 'search', fingerprint(SEARCH_HELPER, 64), '.py')
+    if not helper_path.exists():
+        write_cache_entry(helper_path, SEARCH_HELPER.encode('utf-8'))
+    
+    extra_files = [
+        (index_dir / name, f"{zip_path.stem}.search/{name}")
+        for name in ['indptr.npy', 'chunk_ids.npy', 'weights.npy', 'vocab.json', 'chunks.json']
+    ]
+    extra_files.append((helper_path, 'bm25_search.py'))
+    return extra_files
+
+def find_and_copy_referenced_files(notebook, notebook_dir, output_dir, cache_dir=None):
     """Find files referenced in markdown cells and copy them to output."""
     copied_files = []
     
@@ -477,16 +1817,15 @@ def find_and_copy_referenced_files(notebook, notebook_dir, output_dir):
                     if source_file.exists():
                         # Copy to output directory
                         dest_file = output_dir / match
-                        dest_file.parent.mkdir(parents=True, exist_ok=True)
                         
                         if not dest_file.exists():
-                            shutil.copy2(source_file, dest_file)
+                            copy_file(source_file, dest_file, cache_dir)
                             copied_files.append(match)
                             print(f"  → Copied referenced file: {match}")
     
     return copied_files
 
-def copy_markdown_referenced_files(content, markdown_dir, output_dir):
+def copy_markdown_referenced_files(content, markdown_dir, output_dir, cache_dir=None):
     """Find files referenced in markdown content and copy them to output."""
     copied_files = []
     
@@ -511,10 +1850,9 @@ def copy_markdown_referenced_files(content, markdown_dir, output_dir):
             if source_file.exists():
                 # Copy to output directory
                 dest_file = output_dir / match
-                dest_file.parent.mkdir(parents=True, exist_ok=True)
                 
                 if not dest_file.exists():
-                    shutil.copy2(source_file, dest_file)
+                    copy_file(source_file, dest_file, cache_dir)
                     copied_files.append(match)
                     print(f"  → Copied referenced file: {match}")
             else:
@@ -522,34 +1860,54 @@ def copy_markdown_referenced_files(content, markdown_dir, output_dir):
     
     return copied_files
 
-def create_slide_thumbnail(pdf_path, output_dir, width=800):
-    """Create a thumbnail of the first page of a PDF."""
-    pdf_name = pdf_path.stem
-    thumb_name = f"{pdf_name}-thumb.png"
+def create_slide_thumbnail(pdf_path, output_dir, width=800, cache_dir=None):
+    """Create a thumbnail of the first page of a PDF, reusing cached renders."""
+    thumb_name = f"{pdf_path.stem}-thumb.png"
     thumb_path = output_dir / thumb_name
     
     if thumb_path.exists():
         return thumb_name
     
+    entry = None
+    if cache_dir is not None:
+        entry = cache_entry(cache_dir, 'thumbnails', f"{file_digest(pdf_path, cache_dir)}-{width}", '.png')
+        if entry.exists():
+            link_or_copy(entry, thumb_path)
+            return thumb_name
+    
+    if render_pdf_thumbnail(pdf_path, thumb_path, width):
+        print(f"  → Created slide thumbnail: {thumb_name}")
+        if entry is not None:
+            atomic_copy(thumb_path, entry)
+        return thumb_name
+    
+    print(f"  ⚠ Could not create thumbnail for {pdf_path.name} (install ImageMagick or poppler-utils)")
+    return None
+
+def render_pdf_thumbnail(pdf_path, thumb_path, width=800):
+    """Render the first page of a PDF to a PNG. Returns True on success."""
     try:
         # Try using ImageMagick's convert command
+        tmp_path = temp_path_for(thumb_path).with_suffix('.png')
         cmd = [
             'convert',
             '-density', '150',
             f'{pdf_path}[0]',  # First page only
             '-resize', f'{width}x',
             '-quality', '85',
-            str(thumb_path)
+            str(tmp_path)
         ]
         result = subprocess.run(cmd, capture_output=True, text=True)
         if result.returncode == 0:
-            print(f"  → Created slide thumbnail: {thumb_name}")
-            return thumb_name
+            os.replace(tmp_path, thumb_path)
+            return True
     except:
         pass
     
     # If ImageMagick fails, try pdftoppm
     try:
+        # pdftoppm appends .png to the output prefix
+        prefix = thumb_path.with_name(f"{thumb_path.stem}.{threading.get_ident()}")
         cmd = [
             'pdftoppm',
             '-f', '1',
@@ -558,42 +1916,41 @@ def create_slide_thumbnail(pdf_path, output_dir, width=800):
             '-r', '150',
             '-singlefile',
             str(pdf_path),
-            str(output_dir / pdf_name)
+            str(prefix)
         ]
         result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode == 0:
-            # pdftoppm creates a file with .png extension
-            if (output_dir / f"{pdf_name}.png").exists():
-                shutil.move(output_dir / f"{pdf_name}.png", thumb_path)
-                print(f"  → Created slide thumbnail: {thumb_name}")
-                return thumb_name
+        rendered = prefix.with_name(prefix.name + '.png')
+        if result.returncode == 0 and rendered.exists():
+            os.replace(rendered, thumb_path)
+            return True
     except:
         pass
     
-    print(f"  ⚠ Could not create thumbnail for {pdf_path.name} (install ImageMagick or poppler-utils)")
-    return None
+    return False
 
-def generate_slide_embed(slide_file, notebook_dir, output_dir, item_type='notebook'):
+def generate_slide_embed(slide_file, notebook_dir, output_dir, item_type='notebook', config=None):
     """Generate HTML for slide embedding with lazy loading."""
+    config = config or {}
+    cache_dir = get_cache_dir(config)
+    
     # Copy the slide PDF to output
     source_pdf = notebook_dir / slide_file
     if not source_pdf.exists():
         # Try as absolute path from project root
-        source_pdf = Path(slide_file)
+        source_pdf = resolve_path(config, slide_file)
         if not source_pdf.exists():
             print(f"\n❌ ERROR: Slide file not found: {slide_file}")
             print(f"   Looked in: {notebook_dir / slide_file}")
-            print(f"   Also tried: {Path(slide_file)}")
+            print(f"   Also tried: {source_pdf}")
             sys.exit(1)
     
     dest_pdf = output_dir / slide_file
     if not dest_pdf.exists():
-        dest_pdf.parent.mkdir(parents=True, exist_ok=True)
-        shutil.copy2(source_pdf, dest_pdf)
+        copy_file(source_pdf, dest_pdf, cache_dir)
         print(f"  → Copied slide file: {slide_file}")
     
     # Create thumbnail
-    thumb_name = create_slide_thumbnail(source_pdf, output_dir)
+    thumb_name = create_slide_thumbnail(source_pdf, output_dir, cache_dir=cache_dir)
     
     # Generate unique ID for this slide embed
     slide_id = f"slides-{source_pdf.stem}".replace(' ', '-').replace('.', '-')
@@ -619,15 +1976,6 @@ def generate_slide_embed(slide_file, notebook_dir, output_dir, item_type='notebo
         <embed src="./{slide_file}" type="application/pdf" style="width: 100%; height: 600px; border: 1px solid #ddd;">
     </div>
 </div>
-
-<script>
-function loadSlides(id, src) {{
-    const container = document.querySelector(`#${{id}} .slide-container`);
-    const preview = document.querySelector(`#${{id}} .slide-preview`);
-    container.style.display = 'block';
-    preview.style.display = 'none';
-}}
-</script>
 '''
     
     return html
@@ -650,13 +1998,15 @@ def process_markdown(markdown_path, output_dir, config, section_slides=None):
     markdown_dir = markdown_path.parent
     title = frontmatter.get('title', base_name)
     
+    cache_dir = get_cache_dir(config)
+    
     # Copy referenced files (images, videos, etc) from markdown content
-    copy_markdown_referenced_files(markdown_content, markdown_dir, output_dir)
+    copy_markdown_referenced_files(markdown_content, markdown_dir, output_dir, cache_dir)
     
     # Create data zip if data files are specified
     if frontmatter.get('data_files'):
         zip_name = f"{base_name}-data.zip"
-        create_data_zip(frontmatter['data_files'], output_dir / zip_name, markdown_dir)
+        create_data_zip(frontmatter['data_files'], output_dir / zip_name, markdown_dir, config)
     
     # Build the full content with title
     full_content = f"# {title}\n\n"
@@ -667,14 +2017,15 @@ def process_markdown(markdown_path, output_dir, config, section_slides=None):
     if toc:
         full_content += toc + "\n"
     
-    # Add download link if data files exist
-    if frontmatter.get('data_files'):
-        zip_name = f"{base_name}-data.zip"
-        full_content += f'<div class="download-box">\n<strong>Download files:</strong> <a href="./{zip_name}">📦 {zip_name}</a>\n</div>\n\n'
+    # Add download links if data files or shared bundles exist
+    data_zips = get_item_data_zips(frontmatter, base_name, config, markdown_path)
+    if data_zips:
+        zip_links = ' '.join(f'<a href="./{zip_name}">📦 {zip_name}</a>{catalog_link(zip_name, config)}' for zip_name in data_zips)
+        full_content += f'<div class="download-box">\n<strong>Download files:</strong> {zip_links}{dedupe_note(config)}\n</div>\n\n'
     
     # Add slides if specified
     if frontmatter.get('slides'):
-        slide_html = generate_slide_embed(frontmatter['slides'], markdown_dir, output_dir, 'markdown')
+        slide_html = generate_slide_embed(frontmatter['slides'], markdown_dir, output_dir, 'markdown', config)
         full_content += slide_html + '\n\n'
     
     # Add links section if present
@@ -693,9 +2044,9 @@ def process_markdown(markdown_path, output_dir, config, section_slides=None):
     full_content += markdown_content
     
     # Convert to HTML and save
-    html_content = markdown_to_html(full_content, title)
+    html_content = markdown_to_html(full_content, title, cache_dir)
     output_html = output_dir / f"{base_name}.html"
-    with open(output_html, 'w') as f:
+    with atomic_open(output_html) as f:
         f.write(html_content)
     
     print(f"✓ Created {output_html}")
@@ -707,6 +2058,7 @@ def process_markdown(markdown_path, output_dir, config, section_slides=None):
         'description': frontmatter.get('description', ''),
         'html_file': f"{base_name}.html",
         'data_file': f"{base_name}-data.zip" if frontmatter.get('data_files') else None,
+        'data_bundles': get_bundle_zips(frontmatter.get('data_bundles', []), config, markdown_path),
         'section': markdown_dir.name,
         'type': 'markdown',
         'order': frontmatter.get('order', None),
@@ -759,8 +2111,8 @@ def create_index(notebooks, config, output_dir):
         section_cfg = section_configs.get(section, {})
         if section_cfg.get('slides'):
             # Get the first item's folder to determine the section directory
-            section_dir = Path(section_items[0]['section_folder']) if section_items else Path('.')
-            slide_html = generate_slide_embed(section_cfg['slides'], section_dir.parent, Path(config.get('output_dir', 'docs')), 'index')
+            section_dir = Path(section_items[0]['section_folder']) if section_items else resolve_path(config, '.')
+            slide_html = generate_slide_embed(section_cfg['slides'], section_dir.parent, output_dir, 'index', config)
             notebooks_md.append('\n' + slide_html + '\n')
         
         # Sort items: first by those with order (ascending), then by filename (descending)
@@ -793,7 +2145,9 @@ def create_index(notebooks, config, output_dir):
                 notebooks_md.append('<div>\n')
                 # notebooks_md.append(f'📄 View: <a href="./{item["html_file"]}">content</a><br>\n')
                 if item['data_file']:
-                    notebooks_md.append(f'📦 Data: <a href="./{item["data_file"]}">{item["data_file"]}</a><br>\n')
+                    notebooks_md.append(f'📦 Data: <a href="./{item["data_file"]}">{item["data_file"]}</a>{catalog_link(item["data_file"], config)}<br>\n')
+                for bundle_zip in item.get('data_bundles', []):
+                    notebooks_md.append(f'📦 Shared data: <a href="./{bundle_zip}">{bundle_zip}</a>{catalog_link(bundle_zip, config)}<br>\n')
                 notebooks_md.append('</div>\n')
             else:
                 # Handle notebooks
@@ -809,7 +2163,9 @@ def create_index(notebooks, config, output_dir):
                 notebooks_md.append(f'📓 Download: <a href="./{item["exercise_file"]}">worksheet</a> | ')
                 notebooks_md.append(f'<a href="./{item["answers_file"]}">completed</a><br>\n')
                 if item['data_file']:
-                    notebooks_md.append(f'📦 Data: <a href="./{item["data_file"]}">{item["data_file"]}</a>\n')
+                    notebooks_md.append(f'📦 Data: <a href="./{item["data_file"]}">{item["data_file"]}</a>{catalog_link(item["data_file"], config)}\n')
+                for bundle_zip in item.get('data_bundles', []):
+                    notebooks_md.append(f'<br>📦 Shared data: <a href="./{bundle_zip}">{bundle_zip}</a>{catalog_link(bundle_zip, config)}\n')
                 notebooks_md.append('</div>\n')
             
             # Add slides mention if present (only item-specific slides, not section slides)
@@ -850,34 +2206,77 @@ def create_index(notebooks, config, output_dir):
     index_content = index_content.replace('{{ organization }}', config.get('organization', ''))
     
     # Convert to HTML and write
-    html_content = markdown_to_html(index_content, config.get('title', 'Workshop'))
-    with open(output_dir / 'index.html', 'w') as f:
+    html_content = markdown_to_html(index_content, config.get('title', 'Workshop'), get_cache_dir(config))
+    with atomic_open(output_dir / 'index.html') as f:
         f.write(html_content)
     
     print(f"✓ Created {output_dir / 'index.html'}")
 
-def main():
-    """Process all notebooks and create data packages."""
-    config = load_config()
-    output_dir = Path(config.get('output_dir', 'docs'))
-    
-    # Clean up old publish directory
-    if output_dir.exists():
-        import shutil
-        shutil.rmtree(output_dir)
-        print(f"✓ Cleaned up old {output_dir}/ directory")
-    
-    output_dir.mkdir(exist_ok=True)
-    
-    # Look for notebooks and markdown files in configured sections
-    sections = config.get('sections', [])
-    if not sections:
-        print("Warning: No sections defined in workshop-config.yaml")
-        return
+# Text artifacts worth serving precompressed
+PRECOMPRESS_EXTENSIONS = {'.html', '.css', '.js', '.json', '.ipynb', '.svg', '.txt', '.csv', '.xml', '.md'}
+
+def compress_gzip(data):
+    # mtime=0 keeps output byte-identical between publishes
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+def compress_brotli(data):
+    return brotli.compress(data, quality=11)
+
+def precompress_file(path, encodings, cache_dir):
+    """Write compressed siblings for one file. Returns (encoding, original, compressed, cached) tuples."""
+    data = path.read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    results = []
+    
+    for suffix, compress in encodings:
+        entry = cache_entry(cache_dir, 'precompress', digest, suffix)
+        cached = entry.exists()
+        if cached:
+            compressed = entry.read_bytes()
+        else:
+            compressed = compress(data)
+            write_cache_entry(entry, compressed)
+        
+        # Not worth serving if compression doesn't help
+        if len(compressed) >= len(data):
+            continue
+        
+        with atomic_open(path.with_name(path.name + suffix), 'wb') as f:
+            f.write(compressed)
+        results.append((suffix, len(data), len(compressed), cached))
     
-    processed_items = []
+    return results
+
+def precompress_output(output_dir, config):
+    """Write .gz (and .br when brotli is installed) siblings for every text artifact."""
+    encodings = [('.gz', compress_gzip)]
+    if brotli:
+        encodings.append(('.br', compress_brotli))
+    else:
+        print("  (brotli not installed, writing .gz only - pip install brotli)")
+    
+    files = sorted(
+        path for path in output_dir.rglob('*')
+        if path.is_file() and path.suffix.lower() in PRECOMPRESS_EXTENSIONS
+    )
+    cache_dir = get_cache_dir(config)
+    
+    with ThreadPoolExecutor(max_workers=get_worker_count(config)) as executor:
+        all_results = list(executor.map(lambda path: precompress_file(path, encodings, cache_dir), files))
+    
+    for suffix, _ in encodings:
+        rows = [row for results in all_results for row in results if row[0] == suffix]
+        original = sum(row[1] for row in rows)
+        compressed = sum(row[2] for row in rows)
+        cached = sum(1 for row in rows if row[3])
+        print(f"✓ Wrote {len(rows)} {suffix} files ({cached} from cache): "
+              f"{format_bytes(original)} → {format_bytes(compressed)}, saved {format_bytes(original - compressed)}")
+
+def collect_items(config):
+    """List every notebook and markdown file in the configured sections, in config order."""
+    items = []
     
-    for section in sections:
+    for section in config.get('sections', []):
         if isinstance(section, dict):
             folder = section.get('folder')
             title = section.get('title', folder)
@@ -888,46 +2287,455 @@ def main():
             title = section
             section_slides = None
             
-        if not folder or not Path(folder).exists():
+        if not folder or not resolve_path(config, folder).exists():
             print(f"Warning: Section folder '{folder}' not found")
             continue
-            
-        # Process notebooks
-        for notebook_path in Path(folder).glob('*.ipynb'):
+        
+        folder_path = resolve_path(config, folder)
+        for notebook_path in sorted(folder_path.glob('*.ipynb')):
             # Skip checkpoints
             if '.ipynb_checkpoints' in str(notebook_path):
                 continue
-            
-            print(f"\nProcessing {notebook_path}")
-            notebook_info = process_notebook(notebook_path, output_dir, config, section_slides)
-            if notebook_info:
-                # Override section with configured title
-                notebook_info['section'] = title
-                notebook_info['section_folder'] = folder
-                # Add section slides if not overridden
-                if section_slides and not notebook_info.get('slides'):
-                    notebook_info['section_slides'] = section_slides
-                processed_items.append(notebook_info)
+            items.append({'type': 'notebook', 'path': notebook_path, 'section': title,
+                          'section_folder': str(folder_path), 'section_slides': section_slides})
+        for markdown_path in sorted(folder_path.glob('*.md')):
+            items.append({'type': 'markdown', 'path': markdown_path, 'section': title,
+                          'section_folder': str(folder_path), 'section_slides': section_slides})
+    
+    return items
+
+def process_item(item, output_dir, config):
+    """Process one notebook or markdown item from collect_items() and return its index info."""
+    print(f"\nProcessing {item['path']}")
+    if item['type'] == 'notebook':
+        info = process_notebook(item['path'], output_dir, config, item['section_slides'])
+    else:
+        info = process_markdown(item['path'], output_dir, config, item['section_slides'])
+    
+    if info:
+        # Override section with configured title
+        info['section'] = item['section']
+        info['section_folder'] = item['section_folder']
+        # Add section slides if not overridden
+        if item['section_slides'] and not info.get('slides'):
+            info['section_slides'] = item['section_slides']
+    return info
+
+SHARD_MANIFEST = 'shard.json'
+
+def parse_shard(spec):
+    """Parse a --shard spec like "2/8" into (2, 8)."""
+    try:
+        index, count = (int(part) for part in spec.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected K/N, e.g. 2/8, got '{spec}'")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"shard {index} is outside 1..{count}")
+    return index, count
+
+def shards_root(output_dir):
+    """Where shard builds of output_dir go, e.g. .docs.shards/ next to docs/."""
+    return output_dir.with_name(f".{output_dir.name}.shards")
+
+def shard_name(shard=None, sections=None):
+    """Directory name for one shard's outputs, e.g. shard-2-of-8 or section-structured-data."""
+    parts = []
+    if sections:
+        parts.append('section-' + '+'.join(sorted(re.sub(r'[^\w.-]+', '-', section) for section in sections)))
+    if shard:
+        parts.append(f"shard-{shard[0]}-of-{shard[1]}")
+    return '_'.join(parts)
+
+def select_items(items, config, shard=None, sections=None):
+    """Pick this shard's items from collect_items(), as (index, item) pairs.
+    
+    --section keeps the items of sections matching by folder or title; --shard K/N
+    then deals the rest round-robin, so every runner picks the same subset from the
+    same checkout and big sections are spread across shards.
+    """
+    selected = list(enumerate(items))
+    if sections:
+        folders = {resolve_path(config, section).resolve() for section in sections}
+        selected = [
+            (index, item) for index, item in selected
+            if item['section'] in sections or Path(item['section_folder']).resolve() in folders
+        ]
+        if not selected:
+            print(f"\n❌ ERROR: No items found in section(s): {', '.join(sections)}")
+            sys.exit(1)
+    if shard:
+        selected = selected[shard[0] - 1::shard[1]]
+    return selected
+
+def select_bundles(config, items, shard=None, sections=None):
+    """Pick the data bundles this shard builds.
+    
+    With --section, a bundle belongs to the section whose folder holds its files;
+    --shard K/N deals bundles round-robin like items. Bundles no shard claimed are
+    built by merge_workshop().
+    """
+    names = list(config.get('data_bundles') or {})
+    if sections:
+        folders = {Path(item['section_folder']).resolve() for _, item in items}
+        names = [
+            name for name in names
+            if any(resolve_path(config, config['data_bundles'][name].get('folder', '.')).resolve().is_relative_to(folder)
+                   for folder in folders)
+        ]
+    if shard:
+        names = names[shard[0] - 1::shard[1]]
+    return names
+
+def write_shard_manifest(shard_dir, selected, results, items, config):
+    """Record a shard's item infos, so merge_workshop() can build the index without redoing them.
+    
+    Written last: a shard directory without shard.json is unfinished.
+    """
+    partial = {
+        'total_items': len(items),
+        'items': [
+            {
+                'index': index,
+                'path': Path(os.path.relpath(item['path'], config['config_dir'])).as_posix(),
+                'info': info,
+            }
+            for (index, item), info in zip(selected, results)
+        ],
+    }
+    with atomic_open(shard_dir / SHARD_MANIFEST) as f:
+        json.dump(partial, f, indent=1)
+    print(f"\n✓ Built {len(selected)} of {len(items)} items into {shard_dir}/")
+
+def merge_shard_files(shard_dir, staging_dir, cache_dir):
+    """Hardlink a shard's outputs into staging_dir; files several shards made must match."""
+    for path in sorted(shard_dir.rglob('*')):
+        dest = staging_dir / path.relative_to(shard_dir)
+        if path.is_dir():
+            dest.mkdir(parents=True, exist_ok=True)
+            continue
+        if path.parent == shard_dir and path.name == SHARD_MANIFEST:
+            continue
+        if dest.exists():
+            if file_digest(dest, cache_dir) != file_digest(path, cache_dir):
+                print(f"\n❌ ERROR: Shards disagree about {dest.relative_to(staging_dir)}")
+                print(f"   Conflicting copy: {path}")
+                sys.exit(1)
+            continue
+        link_or_copy(path, dest)
+
+def merge_workshop(config, output_dir):
+    """Combine every finished shard of a workshop, then run the whole-site stages once.
+    
+    Gives the same output as an unsharded publish, as long as the shards ran the same
+    commit with the same package versions (zip members carry a fixed timestamp, not
+    the checkout's mtimes): item infos are put back in config order, bundles no shard
+    built are built here, and the shards are removed afterwards.
+    """
+    shards_dir = shards_root(output_dir)
+    shard_dirs = sorted(path.parent for path in shards_dir.glob(f"*/{SHARD_MANIFEST}"))
+    if not shard_dirs:
+        print(f"\n❌ ERROR: No finished shards in {shards_dir}/")
+        print("   Build some first with --shard K/N or --section NAME")
+        sys.exit(1)
+    
+    output_dir, staging_dir, previous_manifests = prepare_output_dir(config)
+    cache_dir = get_cache_dir(config)
+    items = collect_items(config)
+    infos = {}
+    
+    print(f"\nMerging {len(shard_dirs)} shards...")
+    for shard_dir in shard_dirs:
+        with open(shard_dir / SHARD_MANIFEST) as f:
+            partial = json.load(f)
+        for result in partial['items']:
+            index = result['index']
+            if partial['total_items'] != len(items) or \
+                    result['path'] != Path(os.path.relpath(items[index]['path'], config['config_dir'])).as_posix():
+                print(f"\n❌ ERROR: Shard {shard_dir.name} was built from a different checkout")
+                print(f"   Rebuild it, or remove {shard_dir}/")
+                sys.exit(1)
+            infos.setdefault(index, result['info'])
+        merge_shard_files(shard_dir, staging_dir, cache_dir)
+        print(f"  → {shard_dir.name}: {len(partial['items'])} items")
+    
+    missing = [item for index, item in enumerate(items) if index not in infos]
+    if missing:
+        print(f"\n❌ ERROR: {len(missing)} items aren't in any shard, e.g. {missing[0]['path']}")
+        print(f"   Finished shards: {', '.join(shard_dir.name for shard_dir in shard_dirs)}")
+        sys.exit(1)
+    
+    unbuilt = [
+        name for name in (config.get('data_bundles') or {})
+        if not (staging_dir / bundle_zip_name(name)).exists()
+    ]
+    build_data_bundles(config, staging_dir, names=unbuilt)
+    
+    processed_items = []
+    for index, item in enumerate(items):
+        info = infos[index]
+        if info:
+            # Shards may have run from another checkout path
+            info['section_folder'] = item['section_folder']
+            processed_items.append(info)
+    
+    finish_workshop(processed_items, config, output_dir, staging_dir, previous_manifests)
+    shutil.rmtree(shards_dir)
+    return processed_items
+
+@contextmanager
+def publish_lock(output_dir):
+    """Hold an exclusive lock on .<output_dir>.lock for the duration of a publish.
+    
+    The OS releases the lock when its holder exits, even after a crash, so a lock
+    file left behind never blocks the next publish and needs no stale-pid check.
+    """
+    lock_path = output_dir.with_name(f".{output_dir.name}.lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, 'a+') as f:
+        try:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            print(f"\n❌ ERROR: Another publish is already writing {output_dir}/")
+            print(f"   Lock file: {lock_path}")
+            sys.exit(1)
         
-        # Process markdown files
-        for markdown_path in Path(folder).glob('*.md'):
-            print(f"\nProcessing {markdown_path}")
-            markdown_info = process_markdown(markdown_path, output_dir, config, section_slides)
-            if markdown_info:
-                # Override section with configured title
-                markdown_info['section'] = title
-                markdown_info['section_folder'] = folder
-                # Add section slides if not overridden
-                if section_slides and not markdown_info.get('slides'):
-                    markdown_info['section_slides'] = section_slides
-                processed_items.append(markdown_info)
+        # The pid is only informational; the lock itself is what counts
+        f.seek(0)
+        f.truncate()
+        f.write(str(os.getpid()))
+        f.flush()
+        yield
+
+def exchange_directories(a, b):
+    """Atomically swap two directories with Linux renameat2(RENAME_EXCHANGE).
+    
+    Returns False where that isn't available, so the caller can fall back.
+    """
+    try:
+        renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+    except (OSError, AttributeError):
+        return False
+    AT_FDCWD = -100
+    RENAME_EXCHANGE = 2
+    return renameat2(AT_FDCWD, os.fsencode(a), AT_FDCWD, os.fsencode(b), RENAME_EXCHANGE) == 0
+
+def swap_into_place(staging_dir, output_dir):
+    """Replace output_dir with the finished staging_dir, without a window where it's missing."""
+    if not output_dir.exists():
+        os.rename(staging_dir, output_dir)
+        return
+    
+    if exchange_directories(staging_dir, output_dir):
+        old_dir = staging_dir
+    else:
+        # Two renames: output_dir is briefly absent, but never half-written
+        old_dir = staging_dir.with_name(f"{staging_dir.name}.old")
+        os.rename(output_dir, old_dir)
+        os.rename(staging_dir, output_dir)
+    shutil.rmtree(old_dir)
+
+def reuse_unchanged_files(staging_dir, output_dir, cache_dir):
+    """Hardlink staged files that are byte-identical to the live ones, so they keep their inode and mtime."""
+    reused = 0
+    for staged in staging_dir.rglob('*'):
+        live = output_dir / staged.relative_to(staging_dir)
+        if not staged.is_file() or not live.is_file():
+            continue
+        if os.path.samefile(staged, live) or staged.stat().st_size != live.stat().st_size:
+            continue
+        if file_digest(staged, cache_dir) == file_digest(live, cache_dir):
+            link_or_copy(live, staged)
+            reused += 1
+    return reused
+
+def prepare_output_dir(config):
+    """Create a fresh staging directory next to output_dir and write the shared site assets.
+    
+    The live output_dir is left untouched until finish_workshop() swaps the staging
+    directory into place. Returns (output_dir, staging_dir, previous_manifests).
+    """
+    output_dir = resolve_path(config, config.get('output_dir', 'docs'))
+    staging_dir = output_dir.with_name(f".{output_dir.name}.staging")
+    
+    # Remember what the last publish shipped so we can emit delta updates
+    previous_manifests = load_data_manifests(output_dir)
+    
+    # Clean up after any publish that crashed mid-build
+    for leftover in [staging_dir, staging_dir.with_name(f"{staging_dir.name}.old")]:
+        if leftover.exists():
+            shutil.rmtree(leftover)
+            print(f"✓ Cleaned up leftover {leftover}/ directory")
+    
+    staging_dir.mkdir(parents=True)
+    write_site_assets(staging_dir)
+    return output_dir, staging_dir, previous_manifests
+
+def finish_workshop(processed_items, config, output_dir, staging_dir, previous_manifests):
+    """Run the whole-site stages once every item of a workshop is built, then go live."""
+    print("\nVersioning data files...")
+    create_data_manifests(staging_dir, previous_manifests, config, output_dir)
     
     # Create index.html
     if processed_items:
         print("\nCreating index.html...")
-        create_index(processed_items, config, output_dir)
+        create_index(processed_items, config, staging_dir)
+    
+    if config.get('precompress'):
+        print("\nPrecompressing text files...")
+        precompress_output(staging_dir, config)
+    
+    if output_dir.exists():
+        reused = reuse_unchanged_files(staging_dir, output_dir, get_cache_dir(config))
+        print(f"\n✓ {reused} files unchanged since the last publish")
+    swap_into_place(staging_dir, output_dir)
     
     print(f"\n✓ Published {len(processed_items)} items to {output_dir}/")
 
+def load_configs(config_paths, workers=None, cache_dir=None):
+    """Load workshop configs with command-line overrides; returns (configs, output_dirs)."""
+    configs = []
+    for config_path in config_paths:
+        config = load_config(config_path)
+        if workers:
+            config['workers'] = workers
+        if cache_dir:
+            config['cache_dir'] = str(Path(cache_dir).resolve())
+        configs.append(config)
+    
+    # Without a cache_dir, every workshop uses the first one's, so the batch shares one cache
+    if configs:
+        shared_cache = str(resolve_path(configs[0], '.publish-cache').resolve())
+        for config in configs:
+            config.setdefault('cache_dir', shared_cache)
+    
+    output_dirs = [resolve_path(config, config.get('output_dir', 'docs')).resolve() for config in configs]
+    if len(set(output_dirs)) != len(output_dirs):
+        print("\n❌ ERROR: Several workshops publish to the same output_dir")
+        sys.exit(1)
+    return configs, output_dirs
+
+def publish_workshops(config_paths, workers=None, cache_dir=None, shard=None, sections=None):
+    """Publish several workshops at once.
+    
+    Items and data bundles from every workshop are scheduled on one worker pool, and
+    all workshops share the content-addressed build cache, so datasets, slides and
+    assets used by several workshops are only zipped/rendered/copied once.
+    With shard and/or sections, only that subset is built, into .<output_dir>.shards/,
+    for merge_shards() to finish.
+    Returns a list of processed item infos per config, in order.
+    """
+    configs, output_dirs = load_configs(config_paths, workers, cache_dir)
+    with ExitStack() as locks:
+        try:
+            results = run_workshops(configs, output_dirs, locks, workers, shard, sections)
+        finally:
+            shutdown_pools()
+    prune_caches(configs)
+    return results
+
+def merge_shards(config_paths, workers=None, cache_dir=None):
+    """Combine the shards built by publish_workshops() and publish each workshop."""
+    configs, output_dirs = load_configs(config_paths, workers, cache_dir)
+    with ExitStack() as locks:
+        results = []
+        for config, output_dir in zip(configs, output_dirs):
+            locks.enter_context(publish_lock(output_dir))
+            results.append(merge_workshop(config, output_dir))
+    shutdown_pools()
+    prune_caches(configs)
+    return results
+
+def prepare_shard_dir(output_dir, shard, sections):
+    """Create an empty directory for one shard's outputs, replacing any earlier attempt."""
+    shard_dir = shards_root(output_dir) / shard_name(shard, sections)
+    if shard_dir.exists():
+        shutil.rmtree(shard_dir)
+    shard_dir.mkdir(parents=True)
+    return shard_dir
+
+def run_workshops(configs, output_dirs, locks, workers=None, shard=None, sections=None):
+    """Build every workshop into its staging directory on one pool, then swap each into place.
+    
+    Sharded builds stop after writing their items and partial manifest instead.
+    """
+    sharded = bool(shard or sections)
+    workshops = []
+    for config, output_dir in zip(configs, output_dirs):
+        if not config.get('sections'):
+            print(f"Warning: No sections defined in {config['config_path']}")
+            workshops.append(None)
+            continue
+        items = collect_items(config)
+        if sharded:
+            selected = select_items(items, config, shard, sections)
+            bundle_names = select_bundles(config, selected, shard, sections)
+            locks.enter_context(publish_lock(shards_root(output_dir) / shard_name(shard, sections)))
+            staging_dir, previous_manifests = prepare_shard_dir(output_dir, shard, sections), None
+        else:
+            selected, bundle_names = list(enumerate(items)), None
+            locks.enter_context(publish_lock(output_dir))
+            output_dir, staging_dir, previous_manifests = prepare_output_dir(config)
+        workshops.append((config, output_dir, staging_dir, previous_manifests, items, selected, bundle_names))
+    
+    pool_size = workers or max(get_worker_count(config) for config in configs)
+    with ThreadPoolExecutor(max_workers=pool_size) as executor:
+        bundle_futures = []
+        item_futures = []
+        for workshop in workshops:
+            if workshop is None:
+                item_futures.append([])
+                continue
+            config, _, staging_dir, _, _, selected, bundle_names = workshop
+            bundle_futures.extend(build_data_bundles(config, staging_dir, executor, bundle_names))
+            item_futures.append([
+                executor.submit(process_item, item, staging_dir, config)
+                for _, item in selected
+            ])
+        
+        for future in bundle_futures:
+            future.result()
+        results = [[future.result() for future in futures] for futures in item_futures]
+    
+    for workshop, infos in zip(workshops, results):
+        if workshop is None:
+            continue
+        config, output_dir, staging_dir, previous_manifests, items, selected, _ = workshop
+        if sharded:
+            write_shard_manifest(staging_dir, selected, infos, items, config)
+        else:
+            finish_workshop([info for info in infos if info], config, output_dir, staging_dir, previous_manifests)
+    
+    return [[info for info in infos if info] for infos in results]
+
+def publish(config_path='workshop-config.yaml', workers=None, cache_dir=None):
+    """Publish a single workshop. Returns the processed item infos."""
+    return publish_workshops([config_path], workers, cache_dir)[0]
+
+def main():
+    """Process all notebooks and create data packages."""
+    parser = argparse.ArgumentParser(description="Publish workshop notebooks and data packages.")
+    parser.add_argument('configs', nargs='*', default=['workshop-config.yaml'],
+                        help="workshop config files to publish (default: workshop-config.yaml)")
+    parser.add_argument('--workers', type=int, help="size of the shared worker pool (default: CPU count)")
+    parser.add_argument('--cache-dir', help="build cache shared by every workshop")
+    parser.add_argument('--shard', type=parse_shard, metavar='K/N',
+                        help="build only the K-th of N slices of the items into .<output_dir>.shards/")
+    parser.add_argument('--section', action='append', dest='sections', metavar='NAME',
+                        help="build only this section (folder or title) as a shard; repeatable")
+    parser.add_argument('--merge', action='store_true',
+                        help="combine finished shards, build the index and publish")
+    args = parser.parse_args()
+    
+    if args.merge and (args.shard or args.sections):
+        parser.error("--merge can't be combined with --shard or --section")
+    if args.merge:
+        merge_shards(args.configs, args.workers, args.cache_dir)
+    else:
+        publish_workshops(args.configs, args.workers, args.cache_dir, args.shard, args.sections)
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()